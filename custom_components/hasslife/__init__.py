@@ -7,13 +7,26 @@ from homeassistant.const import (
 )
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.typing import ConfigType
+from homeassistant.loader import async_get_integration
 from .hasslife_config import HASSLIFE_CONFIGS
 from .client_optimized import OptimizedTcpClient as TcpClient
+from .connection import parse_endpoints
 from .utils import LOGGER
-from .const import VERSION
+from .const import DEFAULT_VERSION, get_version
 
 DOMAIN = 'hasslife'
 NOTIFYID = 'hasslifenotifyid'
+PLATFORMS = ["sensor"]
+
+async def async_get_version(hass: HomeAssistant) -> str:
+    """版本号 - 优先使用HA已加载的manifest，失败时在执行器中读取文件"""
+    try:
+        integration = await async_get_integration(hass, DOMAIN)
+        if integration.version:
+            return str(integration.version)
+    except Exception:
+        pass
+    return await hass.async_add_executor_job(get_version) or DEFAULT_VERSION
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     # Load config mode from configuration.yaml.
@@ -33,24 +46,30 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
     # Load config mode from configuration.yaml.
     cfg = dict(entry.data)
-    cfg.update({"version": VERSION})
+    cfg.update({"version": await async_get_version(hass)})
     if 'mode' in cfg:
         HASSLIFE_CONFIGS.load(cfg['mode'])
     else:
         HASSLIFE_CONFIGS.load('release')
     HASSLIFE_CONFIGS.get_config_object()["hassconfig"] = cfg
-    client = TcpClient(HASSLIFE_CONFIGS.get_config_object()['server']['host'],
-        int(HASSLIFE_CONFIGS.get_config_object()['server']['port']),hass)
+    server = HASSLIFE_CONFIGS.get_config_object()['server']
+    endpoints = cfg.get('endpoints')
+    endpoints = parse_endpoints(endpoints, int(server['port'])) if endpoints else server.get('endpoints')
+    client = TcpClient(server['host'], int(server['port']), hass,
+        cfg.get('transport', server.get('transport', 'stream')),
+        endpoints)
     await client.start()
     hass.data[DOMAIN][entry.entry_id] = {
         "client": client,
     }
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     data = hass.data[DOMAIN].get(entry.entry_id)
     if data is not None:
-        data["client"].stop()
+        await data["client"].stop()
         hass.data[DOMAIN].pop(entry.entry_id)
-    return True
+    return unload_ok
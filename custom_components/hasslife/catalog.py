@@ -0,0 +1,155 @@
+"""
+设备目录索引
+增量维护白名单设备的有序目录，SyncDevice分页直接切片，页面JSON缓存复用。
+只跟踪白名单域内实体的状态事件（新增/移除/名称变化），不监听全部状态变化
+"""
+
+import bisect
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant, State, callback
+from homeassistant.helpers.event import TrackStates, async_track_state_change_filtered
+
+from . import codec
+from .utils import LOGGER
+
+# 页面/搜索缓存最多保留的条目数，超出后整体清空
+PAGE_CACHE_SIZE = 256
+SEARCH_CACHE_SIZE = 64
+
+PageKey = Tuple[int, Optional[int], str]
+Page = Tuple[str, int, bool]
+
+
+class DeviceCatalog:
+    """白名单设备目录 - 按entity_id排序，预先计算小写搜索键"""
+
+    def __init__(self, hass: HomeAssistant, white_domains: Iterable[str]):
+        self.hass = hass
+        self.white_domains = set(white_domains)
+        # entity_id -> friendly_name
+        self._names: Dict[str, str] = {}
+        # entity_id -> 小写搜索键
+        self._search_keys: Dict[str, str] = {}
+        self._sorted_ids: List[str] = []
+        self._search_cache: Dict[str, List[str]] = {}
+        self._page_cache: Dict[PageKey, Page] = {}
+        self._fingerprint: Optional[str] = None
+        self._unsubs: List[Callable[[], None]] = []
+
+    def start(self):
+        """加载当前状态并开始跟踪变化"""
+        self.rebuild()
+        # 只分发白名单域的状态事件，其余实体的变化不会调用到这里
+        tracker = async_track_state_change_filtered(
+            self.hass, TrackStates(False, set(), set(self.white_domains)),
+            self._async_on_state_changed,
+        )
+        self._unsubs.append(tracker.async_remove)
+
+    def stop(self):
+        while self._unsubs:
+            self._unsubs.pop()()
+
+    @callback
+    def rebuild(self):
+        """从hass.states全量重建目录"""
+        self._names.clear()
+        self._search_keys.clear()
+        for state in self.hass.states.async_all():
+            if self._is_white(state.entity_id):
+                self._set(state.entity_id, state)
+        self._sorted_ids = sorted(self._names)
+        self._invalidate()
+        LOGGER.debug("Device catalog rebuilt: %d entities", len(self._sorted_ids))
+
+    def _is_white(self, entity_id: str) -> bool:
+        return entity_id.split(".", 1)[0] in self.white_domains
+
+    def _set(self, entity_id: str, state: State):
+        name = state.attributes.get("friendly_name", "")
+        self._names[entity_id] = name
+        self._search_keys[entity_id] = f"{entity_id.lower()}\x00{str(name).lower()}"
+
+    def _invalidate(self):
+        self._search_cache.clear()
+        self._page_cache.clear()
+        self._fingerprint = None
+
+    def fingerprint(self) -> str:
+        """目录指纹 - 实体ID和名称不变时保持不变，服务器据此判断是否需要重新拉取目录"""
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            names = self._names
+            for eid in self._sorted_ids:
+                digest.update(f"{eid}\t{names[eid]}\n".encode())
+            self._fingerprint = digest.hexdigest()[:16]
+        return self._fingerprint
+
+    @callback
+    def _async_on_state_changed(self, event):
+        entity_id = event.data["entity_id"]
+        new_state = event.data.get("new_state")
+
+        if new_state is None:
+            if entity_id in self._names:
+                del self._names[entity_id]
+                del self._search_keys[entity_id]
+                idx = bisect.bisect_left(self._sorted_ids, entity_id)
+                del self._sorted_ids[idx]
+                self._invalidate()
+            return
+
+        known = entity_id in self._names
+        if known and self._names[entity_id] == new_state.attributes.get("friendly_name", ""):
+            # 目录只关心名称，普通状态变化不影响
+            return
+        self._set(entity_id, new_state)
+        if not known:
+            bisect.insort(self._sorted_ids, entity_id)
+        self._invalidate()
+
+    def _matching_ids(self, keyword: str) -> List[str]:
+        if not keyword:
+            return self._sorted_ids
+        ids = self._search_cache.get(keyword)
+        if ids is None:
+            keys = self._search_keys
+            ids = [eid for eid in self._sorted_ids if keyword in keys[eid]]
+            if len(self._search_cache) >= SEARCH_CACHE_SIZE:
+                self._search_cache.clear()
+            self._search_cache[keyword] = ids
+        return ids
+
+    def page(self, page: int = 1, page_size: Optional[int] = 30,
+             search_keyword: Optional[str] = None) -> Page:
+        """返回 (List的JSON字符串, 总数, 是否还有更多)"""
+        keyword = search_keyword.lower() if search_keyword else ""
+        key = (page, page_size, keyword)
+        cached = self._page_cache.get(key)
+        if cached is not None:
+            return cached
+
+        ids = self._matching_ids(keyword)
+        total_count = len(ids)
+        if page_size is None:
+            start_idx, end_idx = 0, total_count
+        else:
+            start_idx = (page - 1) * page_size
+            end_idx = start_idx + page_size
+        names = self._names
+        send_list = [
+            {'entity_id': eid, 'attributes': {'friendly_name': names[eid]}}
+            for eid in ids[start_idx:end_idx]
+        ]
+        jlist = codec.dumps_str(send_list, sort_keys=True)
+        result = (jlist, total_count, end_idx < total_count)
+
+        if len(self._page_cache) >= PAGE_CACHE_SIZE:
+            self._page_cache.clear()
+        self._page_cache[key] = result
+        return result
+
+    def __len__(self) -> int:
+        return len(self._sorted_ids)
@@ -5,29 +5,50 @@
 import asyncio
 import time
 import struct
-import json
 import hashlib
 import traceback
 import random
-from typing import Optional, Dict, Any
-from homeassistant.const import EVENT_STATE_CHANGED, EVENT_HOMEASSISTANT_STOP
-from homeassistant.core import HomeAssistant, State
-from homeassistant.helpers.json import JSONEncoder
-
-from .const import VERSION
+from functools import partial
+from typing import Optional, Dict, Any, Callable, Iterable, List, Set, Tuple
+from homeassistant.const import ENTITY_MATCH_ALL, ENTITY_MATCH_NONE, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import HomeAssistant, State, callback, valid_entity_id
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import (DEFAULT_VERSION, CONNECT_JITTER, CLIENT_FEATURES, FEATURE_BATCH_STATE, FEATURE_ATTR_DELTA,
+                    FEATURE_CONTROL_RESULT, FEATURE_ZLIB, MAX_QUERY_STATES)
 from .hasslife_config import HASSLIFE_CONFIGS
 from .utils import LOGGER
-from .state_manager import StateSyncManager
+from .state_manager import StateSyncManager, AttributeDeltaTracker
+from .outbound import OutboundScheduler
+from .dispatcher import InboundDispatcher
+from .protocol import FrameProtocol, FrameParser, MAX_FRAME_SIZE
+from .metrics import ClientMetrics
+from .tracing import ControlTracer
+from .warm_start import WarmStartStore
+from .connection import ConnectionManager, Endpoint
+from .state_cache import EncodedStateCache
+from .heartbeat import (AdaptiveHeartbeat, enable_tcp_keepalive, ACTION_DEAD, ACTION_PING,
+                        HEARTBEAT_INTERVAL)
+from .recording import FrameRecorder, DIRECTION_IN, DIRECTION_OUT, default_path
+from . import codec, compression
 
 
 class OptimizedTcpClient:
+    # 可能耗时的消息类型交给分发器并发处理，其余耗时短且要求有序，直接在接收协程中处理
+    concurrent_types = {"DeviceControl", "SyncDevice", "QueryStates"}
     white_domains = ['button','light','cover','switch','vacuum','water_heater','humidifier','fan','media_player','script','climate','input_boolean','input_button','scene','automation','group','lock']
     is_exited = False
     
-    def __init__(self, host: str, port: int, hass: HomeAssistant):
+    def __init__(self, host: str, port: int, hass: HomeAssistant, transport: str = "stream",
+                 endpoints: Optional[List[Tuple[str, int]]] = None):
         self.host = host
         self.port = port
         self.hass = hass
+        # 服务器列表，host/port为当前连接的服务器
+        self._connections = ConnectionManager(endpoints or [(host, port)])
+        self.endpoint: Optional[Endpoint] = None
+        # 传输层："stream" 使用StreamReader/StreamWriter，"protocol" 使用FrameProtocol
+        self.transport_mode = transport
         
         self.reader: Optional[asyncio.StreamReader] = None
         self.writer: Optional[asyncio.StreamWriter] = None
@@ -36,26 +57,68 @@ class OptimizedTcpClient:
         self.is_init = True
         self._connection_lock = asyncio.Lock()
         self._disconnect_event = asyncio.Event()
-        # 消息队列
-        self._message_queue = asyncio.Queue(maxsize=1000)
+        # 分优先级的出站队列，唯一的发送协程从这里取消息
+        self._outbound = OutboundScheduler(
+            state_builder=self._build_state_messages, on_state_dropped=self._on_state_dropped
+        )
         self._sender_task: Optional[asyncio.Task] = None
         self._receiver_task: Optional[asyncio.Task] = None
         self._heartbeat_task: Optional[asyncio.Task] = None
         self._main_loop_task: Optional[asyncio.Task] = None
         
         self._login_info: Dict[str, Any] = {}
-        self.entity_ids = []
+        # 预编码的登录信息片段，编码消息时直接拼入Payload
+        self._login_fragment = b""
+        # 服务器指定的上报实体，用集合保证每次事件O(1)过滤
+        self.entity_ids: Set[str] = set()
+        # 每个订阅实体单独的状态监听，只有这些实体变化时才会回调
+        self._state_unsubs: Dict[str, Callable[[], None]] = {}
+        # 服务器在Auth请求中声明的能力，每次重连后重新协商
+        self._server_features: Set[str] = set()
+        # 完成Auth前视为离线：状态变化只记入脏集合，Auth后一次性补发
+        self._online = False
+        self._dirty_entities: Set[str] = set()
+        # 属性增量记录，按连接维护
+        self._delta_tracker = AttributeDeltaTracker()
+        # 完整状态的编码缓存，供全量上报和QueryStates复用
+        self._state_cache = EncodedStateCache()
+        # 热启动数据：启动时恢复订阅，首次Auth后只补发上次上报后变化过的实体
+        self._warm_store = WarmStartStore(hass)
+        self._warm_resync = False
         
-        # 优化配置参数
-        self.heartbeat_interval = 10
-        self.heartbeat_timeout = 60
-        self._last_pong_time=time.time()
+        hassconfig = HASSLIFE_CONFIGS.get_config_object().get("hassconfig", {})
+        # 自适应心跳：有流量时不发Ping，空闲时拉长间隔
+        self._heartbeat = AdaptiveHeartbeat(
+            float(hassconfig.get("heartbeat_interval", HEARTBEAT_INTERVAL))
+        )
+
+        # 发送合并：一次写入最多携带的字节数
+        self.max_flush_bytes = 256 * 1024
+        # 协商Zlib后，消息体超过该字节数才尝试压缩
+        self.compress_threshold = compression.COMPRESS_THRESHOLD
+
+        # 运行时指标
+        self.metrics = ClientMetrics()
+        self._disconnected_at: Optional[float] = None
+        self._protocol_bytes_seen = 0
+        # 控制链路追踪，配置trace_control开启
+        self.tracer = ControlTracer(bool(hassconfig.get("trace_control")))
+        # 流量录制，配置record_traffic开启（True使用默认路径，或指定文件路径）
+        self.recorder: Optional[FrameRecorder] = None
+        record_traffic = hassconfig.get("record_traffic")
+        if record_traffic:
+            path = record_traffic if isinstance(record_traffic, str) else default_path(hass.config.config_dir)
+            self.recorder = FrameRecorder(path, hass.async_add_executor_job)
+            LOGGER.warning("Recording HassLife traffic to %s", path)
 
         # 连接管理
         self._retry_count = 0
         self._base_reconnect_delay = 2
         self._max_reconnect_delay = 300
+        # 首次连接前的随机延迟上限
+        self.connect_jitter = float(hassconfig.get("connect_jitter", CONNECT_JITTER))
 
+        self._dispatcher = InboundDispatcher()
         self.protocol_func_bind_map = {}
         self.init_func_bind_map()
 
@@ -68,8 +131,13 @@ class OptimizedTcpClient:
             LOGGER.warning("OptimizedTcpClient already started, skip")
             return
         LOGGER.info("Starting OptimizedTcpClient")
+        await self._warm_store.async_load()
+        if self._warm_store.entity_ids:
+            # 先按上次的订阅开始跟踪，服务器的UpdateEntitys到达后再修正
+            self.entity_ids = set(self._warm_store.entity_ids)
+            self._update_state_listeners(self.entity_ids)
+            self._warm_resync = True
         self._state_manager.start()
-        self.hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_on_state_changed)
         self.hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, self._on_hass_stop)
         self._main_loop_task = asyncio.create_task(self._main_loop())
 
@@ -80,6 +148,7 @@ class OptimizedTcpClient:
         self._disconnect_event.set()
 
         self._state_manager.stop()
+        self._update_state_listeners(set())
 
         await self._cleanup_tasks(
             self._sender_task,
@@ -89,6 +158,9 @@ class OptimizedTcpClient:
         )
 
         await self._close_connection()
+        await self._warm_store.async_flush()
+        if self.recorder:
+            await self.recorder.close()
         LOGGER.info("OptimizedTcpClient stopped")
 
     async def _on_hass_stop(self, _):
@@ -96,12 +168,20 @@ class OptimizedTcpClient:
 
     async def _main_loop(self):
         """主循环"""
-        await asyncio.sleep(random.uniform(0, 5))
         while not self.is_exited:
             try:
                 await self._connect_with_backoff()
+                self.is_connected = True
+                if self._disconnected_at is not None:
+                    self.metrics.inc("reconnects")
+                    self.metrics.observe("reconnect_duration", time.monotonic() - self._disconnected_at)
+                    self._disconnected_at = None
+                self._protocol_bytes_seen = 0
                 self._disconnect_event.clear() 
-                self._last_pong_time = time.time()
+                self._server_features = set()
+                self._delta_tracker.reset()
+                self._heartbeat.reset()
+                enable_tcp_keepalive(self.writer.get_extra_info("socket"))
                 self._sender_task = asyncio.create_task(self._send_worker())
                 self._receiver_task = asyncio.create_task(self._receive_worker())
                 self._heartbeat_task = asyncio.create_task(self._heartbeat_worker())
@@ -111,20 +191,28 @@ class OptimizedTcpClient:
             except Exception:
                 LOGGER.error("Main loop error:\n%s", traceback.format_exc())
             finally:
+                self._online = False
+                if self.is_connected:
+                    self.is_connected = False
+                    self._disconnected_at = time.monotonic()
+                    if not self.is_exited and self.endpoint is not None:
+                        # 连接异常断开，下次优先尝试其他服务器
+                        self._connections.mark_failed(self.endpoint)
                 await self._cleanup_tasks(
                     self._sender_task,
                     self._receiver_task,
                     self._heartbeat_task,
                 )
+                await self._dispatcher.cancel_all()
                 await self._close_connection()
                 await asyncio.sleep(0.2)
                 self._clear_message_queue()
 
     async def _connect_with_backoff(self):
         """异步连接 - 非阻塞实现"""
-        # 首次连接（_retry_count = 0）加一个小随机延迟，避免瞬时雪崩
-        if self._retry_count == 0:
-            initial_delay = random.uniform(0, 5)  # 0~5秒随机延迟
+        # 首次连接（_retry_count = 0）加一个小随机延迟，避免瞬时雪崩；主循环不再另加延迟
+        if self._retry_count == 0 and self.connect_jitter > 0:
+            initial_delay = random.uniform(0, self.connect_jitter)
             if initial_delay > 0:
                 LOGGER.info("Initial connection random delay: %.2fs", initial_delay)
                 await asyncio.sleep(initial_delay)
@@ -143,14 +231,24 @@ class OptimizedTcpClient:
             await asyncio.sleep(delay)
         async with self._connection_lock:
             try:
-                async with asyncio.timeout(5):
-                    self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                # 所有服务器都连不上才计入退避
+                (self.reader, self.writer), self.endpoint = await self._connections.connect(self._open)
+                self.host, self.port = self.endpoint.host, self.endpoint.port
                 self._retry_count = 0
                 LOGGER.info("Connected to %s:%s", self.host, self.port)
             except Exception:
                 self._retry_count += 1
                 raise
 
+    async def _open(self, ip: str, port: int, family: int):
+        """建立到已解析地址的连接，返回 (reader, writer)"""
+        if self.transport_mode == "protocol":
+            _, protocol = await asyncio.get_running_loop().create_connection(
+                lambda: FrameProtocol(FrameParser(codec.loads)), ip, port, family=family
+            )
+            return protocol, protocol
+        return await asyncio.open_connection(ip, port, family=family)
+
     async def _close_connection(self):
         if self.writer:
             try:
@@ -162,11 +260,35 @@ class OptimizedTcpClient:
         self.reader = None
 
     async def _send_worker(self):
-        """消息发送工作协程 - 防阻塞"""
+        """消息发送工作协程 - 取出队列中已有的全部消息，合并为一次写入"""
         try:
+            metrics = self.metrics
             while True:
-                msg = await self._message_queue.get()
-                await self._send_now(msg)
+                msg = await self._outbound.get()
+                metrics.observe("queue_depth", self._outbound.qsize())
+                started = time.perf_counter()
+                messages = [msg]
+                buffers = self._encode_frame(msg)
+                size = len(buffers[0]) + len(buffers[1])
+                while size < self.max_flush_bytes:
+                    msg = self._outbound.get_nowait()
+                    if msg is None:
+                        break
+                    messages.append(msg)
+                    frame = self._encode_frame(msg)
+                    buffers.extend(frame)
+                    size += len(frame[0]) + len(frame[1])
+                metrics.observe("encode_time", time.perf_counter() - started)
+                await self._flush(buffers, size, any(m.get("Type") == "Ping" for m in messages))
+                # 写出成功后才确认并记入热启动数据，失败或断线时未确认的状态转入脏集合
+                flushed = self._outbound.ack(messages)
+                if flushed:
+                    self._warm_store.on_reported(flushed)
+                    if self.tracer.enabled:
+                        self.tracer.on_flushed(s.entity_id for s in flushed)
+                if self._dirty_entities and self._online and self._outbound.empty():
+                    # 积压清空后补发溢出时被挤掉的实体
+                    self._resync_dirty()
         except Exception as e:
             LOGGER.error("_send_worker failed: %s", e)
             self._disconnect_event.set()
@@ -175,48 +297,143 @@ class OptimizedTcpClient:
         """消息接收工作协程 - 防止阻塞"""
         try:
             while True:
-                msg = await self._receive_one()
-                await self.process_json_pack(msg)
+                for msg in await self._receive_batch():
+                    await self.process_json_pack(msg)
         except Exception as e:
             LOGGER.error("_receive_worker failed: %s", e)
             self._disconnect_event.set()
 
     async def _heartbeat_worker(self):
-        """异步心跳 - 防阻塞"""
+        """自适应心跳 - 按策略决定等待、发Ping或判定断线"""
+        heartbeat = self._heartbeat
         try:
             while True:
-                await asyncio.sleep(self.heartbeat_interval)
-                await self.send_message_async({"Type": "Ping"})
-                if time.time() - self._last_pong_time > self.heartbeat_timeout:
+                action, delay = heartbeat.poll()
+                if action == ACTION_DEAD:
                     raise TimeoutError("heartbeat timeout")
+                if action == ACTION_PING:
+                    if await self.send_message_async({"Type": "Ping"}):
+                        heartbeat.on_ping_queued()
+                    else:
+                        await asyncio.sleep(1)
+                    continue
+                await asyncio.sleep(delay)
         except Exception as e:
             LOGGER.error("_heartbeat_worker failed: %s", e)
             self._disconnect_event.set()
 
-    async def send_message_async(self, message: Dict[str, Any]) -> bool:
-        """异步发送消息 - 加入队列"""
-        try:
-            await self._message_queue.put(message)
-            return True
-        except asyncio.QueueFull:
-            LOGGER.error("Message queue full, dropping: %s", message.get("Type"))
+    async def send_message_async(self, message: Dict[str, Any], lane: Optional[int] = None) -> bool:
+        """异步发送消息 - 按消息类型加入对应优先级通道"""
+        if not self._outbound.put_nowait(message, lane):
+            LOGGER.error("Outbound lane full, dropping: %s", message.get("Type"))
             return False
+        return True
+
+    def _encode_frame(self, message: Dict[str, Any]) -> List[bytes]:
+        """编码为 [32字节头, 消息体]，两段分别写出避免拼接拷贝；Payload中拼入预编码的登录信息"""
+        if not self._login_fragment:
+            self.get_login_info()
+        body = codec.encode_message(message, self._login_fragment)
+        msg_type = message.get("Type")
+        LOGGER.debug("Encode: %s", msg_type)
+        if msg_type != "Ping":
+            self._heartbeat.on_activity()
+        if self.recorder:
+            self.recorder.record(DIRECTION_OUT, body)
+        metrics = self.metrics
+        metrics.inc("raw_bytes_sent", 32 + len(body))
+        if len(body) >= self.compress_threshold and self.supports(FEATURE_ZLIB):
+            started = time.perf_counter()
+            packed = compression.compress(body)
+            metrics.observe("compress_time", time.perf_counter() - started)
+            metrics.inc("compress_in_bytes", len(body))
+            metrics.inc("compress_out_bytes", len(packed))
+            if len(packed) < len(body):
+                metrics.inc("compressed_frames")
+                header = compression.pack_header(
+                    len(packed), compression.FLAG_ZLIB, compression.DEFAULT_DICTIONARY, len(body)
+                )
+                return [header, packed]
+        return [struct.pack("<I", len(body)).ljust(32, b"\x00"), body]
 
-    async def _send_now(self, message: Dict[str, Any]) -> bool:
-        """立即发送消息 - 保持协议格式"""
+    async def _flush(self, buffers: List[bytes], size: int, ping: bool = False):
+        """一次向量写入 + 一次drain；ping表示其中包含Ping，写出后才开始计Pong超时"""
         if not self.writer:
-            return False
-        try:
-            body = json.dumps(message, cls=JSONEncoder).encode()
-            header = struct.pack("<I", len(body)).ljust(32, b"\x00")
-            self.writer.write(header + body)
-            await self.writer.drain()
-            LOGGER.info("Sent: %s", message.get("Type"))
-            return True
-        except Exception as e:
-            LOGGER.error("_send_now failed: %s", e)
-            self._disconnect_event.set()
-            return False
+            raise ConnectionError("Writer is None")
+        self.writer.writelines(buffers)
+        started = time.perf_counter()
+        self._heartbeat.on_drain_start()
+        await self.writer.drain()
+        metrics = self.metrics
+        metrics.observe("drain_time", time.perf_counter() - started)
+        metrics.inc("frames_sent", len(buffers) // 2)
+        metrics.inc("flushes")
+        metrics.inc("bytes_sent", size)
+        self._heartbeat.on_sent(ping)
+
+    def get_send_stats(self) -> Dict[str, float]:
+        """发送统计：帧数、写入次数、字节数和每次写入的平均帧数"""
+        counters = self.metrics.counters
+        return {
+            "frames": counters["frames_sent"],
+            "flushes": counters["flushes"],
+            "bytes": counters["bytes_sent"],
+            "frames_per_flush": (
+                counters["frames_sent"] / counters["flushes"] if counters["flushes"] else 0.0
+            ),
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return self._outbound.qsize()
+
+    @property
+    def heartbeat_rtt(self) -> Optional[float]:
+        """平滑后的心跳RTT（秒），尚未测得时为None"""
+        return self._heartbeat.srtt
+
+    def get_diagnostics(self) -> Dict[str, Any]:
+        """诊断信息 - 供HA诊断下载和诊断传感器使用"""
+        return {
+            "connected": self.is_connected,
+            "online": self._online,
+            "transport": self.transport_mode,
+            "endpoint": repr(self.endpoint) if self.endpoint else None,
+            "endpoints": self._connections.get_stats(),
+            "codec": codec.CODEC_NAME,
+            "server_features": sorted(self._server_features),
+            "subscribed_entities": len(self.entity_ids),
+            "dirty_entities": len(self._dirty_entities),
+            "inbound_in_flight": self._dispatcher.in_flight,
+            "heartbeat": self._heartbeat.get_stats(),
+            "outbound": self._outbound.get_stats(),
+            "send": self.get_send_stats(),
+            "sync": self._state_manager.get_sync_stats(),
+            "metrics": self.metrics.as_dict(),
+            "control_trace": self.tracer.as_dict(),
+            "warm_start": self._warm_store.get_stats(),
+            "state_cache": self._state_cache.get_stats(),
+            "recording": self.recorder.get_stats() if self.recorder else None,
+        }
+
+    async def _receive_batch(self) -> List[Dict[str, Any]]:
+        """接收一批消息 - FrameProtocol按批交付，Stream模式每次一帧"""
+        if isinstance(self.reader, FrameProtocol):
+            try:
+                batch = await self.reader.read_batch()
+                received = self.reader.bytes_received
+                self.metrics.inc("bytes_received", received - self._protocol_bytes_seen)
+                self._protocol_bytes_seen = received
+                self.metrics.inc("frames_received", len(batch))
+                if self.recorder:
+                    for msg in batch:
+                        self.recorder.record(DIRECTION_IN, codec.dumps(msg))
+                return batch
+            except Exception as e:
+                LOGGER.error("_receive_batch failed: %s", e)
+                self._disconnect_event.set()
+                raise
+        return [await self._receive_one()]
 
     async def _receive_one(self):
         """异步接收消息 - 防阻塞实现"""
@@ -224,22 +441,26 @@ class OptimizedTcpClient:
             raise ConnectionError("Reader is None")
         try:
             header = await self.reader.readexactly(32)
-            size = struct.unpack("<I", header[:4])[0]
-            if size <= 0 or size > 1024 * 1024:
+            size, flags, dict_id, _ = compression.unpack_header(header)
+            if size <= 0 or size > MAX_FRAME_SIZE:
                 raise ValueError(f"invalid packet size: {size}")
             body = await self.reader.readexactly(size)
-            return json.loads(body.decode())
+            self.metrics.inc("frames_received")
+            self.metrics.inc("bytes_received", 32 + size)
+            if flags & compression.FLAG_ZLIB:
+                body = compression.decompress(body, dict_id, MAX_FRAME_SIZE)
+            if self.recorder:
+                self.recorder.record(DIRECTION_IN, body)
+            return codec.loads(body)
         except Exception as e:
             LOGGER.error("_receive_one failed: %s", e)
             self._disconnect_event.set()
             raise
 
     def _clear_message_queue(self):
-        while not self._message_queue.empty():
-            try:
-                self._message_queue.get_nowait()
-            except Exception:
-                break
+        # 未确认写出的状态上报（排队中、已编码、写出失败的）转入脏集合，重连后补发最新状态
+        self._dirty_entities.update(self._outbound.take_states())
+        self._outbound.clear()
 
     async def _cleanup_tasks(self, *tasks):
         for task in tasks:
@@ -258,29 +479,83 @@ class OptimizedTcpClient:
             "Auth": self.on_auth,
             "Error": self.on_error,
             "SyncDevice": self.on_sync_device,
-            "Pong": self.on_pong
+            "Pong": self.on_pong,
+            "QueryStates": self.on_query_states,
         }
 
     async def process_json_pack(self, jdata):
-        """消息处理"""
-        LOGGER.debug("process_json_pack %s", str(jdata))
-        self._last_pong_time = time.time()
-        handler = self.protocol_func_bind_map.get(jdata.get("Type"))
-        if handler:
+        """消息处理 - 耗时消息并发执行，控制命令按实体保持顺序"""
+        LOGGER.debug("process_json_pack %s", jdata)
+        msg_type = jdata.get("Type")
+        self._heartbeat.on_received()
+        if msg_type != "Pong":
+            self._heartbeat.on_activity()
+        handler = self.protocol_func_bind_map.get(msg_type)
+        if not handler:
+            return
+        if msg_type in self.concurrent_types:
+            keys = self._control_keys(jdata)
+            if msg_type == "DeviceControl" and self.tracer.enabled:
+                trace = self.tracer.start(jdata.get("RequestID", ""), keys)
+                handler = partial(handler, trace=trace)
+            await self._dispatcher.dispatch(handler, jdata, keys)
+        else:
             await handler(jdata)
+
+    @staticmethod
+    def _split_entity_ids(value) -> List[str]:
+        """按HA的cv.entity_ids规范化：逗号分隔的字符串拆开，去空白并转小写"""
+        if isinstance(value, str):
+            value = value.split(",")
+        elif not isinstance(value, list):
+            value = [value]
+        return [str(e).strip().lower() for e in value]
+
+    @staticmethod
+    def _control_keys(jdata) -> Set[str]:
+        """控制命令涉及的entity_id，用于同一实体的命令串行执行"""
+        keys = set()
+        if jdata.get("Type") != "DeviceControl":
+            return keys
+        for row in jdata.get("Payload", {}).get("Rows", []):
+            if not isinstance(row, dict) or not isinstance(row.get("data"), dict):
+                continue
+            entity_id = row["data"].get("entity_id")
+            if isinstance(entity_id, (str, list)):
+                # 与_merge_control_rows相同的规范化，逗号分隔的多个实体分别排序
+                keys.update(OptimizedTcpClient._split_entity_ids(entity_id))
+        return keys
     
 
     async def on_pong(self, jdata):
         """处理服务器的心跳响应"""
-        self._last_pong_time = time.time()
+        rtt = self._heartbeat.on_pong()
+        if rtt is not None:
+            self.metrics.observe("heartbeat_rtt", rtt)
+            if self.endpoint is not None:
+                self._connections.observe_rtt(self.endpoint, rtt)
+
+    @callback
+    def _update_state_listeners(self, entity_ids: Iterable[str]):
+        """按新旧订阅集合的差异增删实体监听"""
+        wanted = set(entity_ids)
+        for entity_id in [e for e in self._state_unsubs if e not in wanted]:
+            self._state_unsubs.pop(entity_id)()
+        for entity_id in wanted.difference(self._state_unsubs):
+            self._state_unsubs[entity_id] = async_track_state_change_event(
+                self.hass, [entity_id], self._async_on_state_changed
+            )
 
-    async def _async_on_state_changed(self, event):
-        """异步状态变化处理"""
+    @callback
+    def _async_on_state_changed(self, event):
+        """订阅实体状态变化处理 - 在事件循环中直接执行，不额外创建任务"""
         new_state = event.data.get("new_state")
         old_state = event.data.get("old_state")
         
         if new_state:
             LOGGER.debug("状态变化事件触发: %s", new_state.entity_id)
+            if self.tracer.enabled:
+                self.tracer.on_state_changed(new_state.entity_id)
             self._state_manager.on_state_changed(
                 new_state.entity_id, old_state, new_state
             )
@@ -290,48 +565,187 @@ class OptimizedTcpClient:
         """设备同步 - 委托给状态管理器，支持分页、搜索和请求ID"""
         await self._state_manager.sync_all_devices(page, page_size, search_keyword, request_id)
     
+    def supports(self, feature: str) -> bool:
+        """服务器是否支持某项协议能力"""
+        return feature in self._server_features
+
+    def _encode_state(self, state: State) -> str:
+        """编码单个状态上报 - 完整快照走编码缓存，属性增量直接编码"""
+        if self.supports(FEATURE_ATTR_DELTA):
+            payload = self._delta_tracker.encode(state)
+            if payload.get("delta"):
+                return codec.dumps_str(payload)
+        return self._state_cache.encode(state)
+
     async def sync_device_state_async(self, state: State):
-        if not state or state.entity_id not in self.entity_ids:
+        await self.sync_device_states_async([state])
+
+    async def sync_device_states_async(self, states: List[State]):
+        """批量上报状态 - 非阻塞登记，同一实体排队中只保留最新状态；离线时只记脏"""
+        entity_ids = self.entity_ids
+        for state in states:
+            if not state or state.entity_id not in entity_ids:
+                continue
+            if self._online:
+                self._outbound.put_state(state)
+            else:
+                self._dirty_entities.add(state.entity_id)
+
+    def _on_state_dropped(self, entity_id: str):
+        """状态队列溢出挤掉的实体记脏，不丢失其最新状态"""
+        self._dirty_entities.add(entity_id)
+
+    def _resync_dirty(self):
+        """补发脏实体的当前状态：Auth后（离线期间的变化）或积压清空后（队列溢出）"""
+        if not self._dirty_entities:
             return
-
-        payload = {
-            "attributes": state.attributes,
-            "entity_id": state.entity_id,
-            "state": state.state,
-        }
-
-        login = self.get_login_info()
-        await self.send_message_async({
-            "Type": "SyncState",
+        dirty, self._dirty_entities = self._dirty_entities, set()
+        count = 0
+        for entity_id in dirty:
+            state = self.hass.states.get(entity_id)
+            if state and entity_id in self.entity_ids:
+                self._outbound.put_state(state)
+                count += 1
+        LOGGER.info("Resync %d dirty entities", count)
+
+    def _resync_changed_since_last_run(self):
+        """启动后首次Auth - 补发与上次运行最后上报内容不同的订阅实体"""
+        states = [s for s in map(self.hass.states.get, self.entity_ids) if s]
+        changed = self._warm_store.changed_states(states)
+        for state in changed:
+            self._outbound.put_state(state)
+        LOGGER.info("Warm start: %d of %d entities changed since last run", len(changed), len(states))
+
+    def _build_state_messages(self, states: List[State]) -> List[Tuple[Dict[str, Any], List[State]]]:
+        """发送时编码状态上报 - 服务器支持时整批合并为一帧，否则逐个上报；返回 [(消息, 携带的状态)]"""
+        states = [s for s in states if s.entity_id in self.entity_ids]
+        if not states:
+            return []
+
+        # 登录信息由_encode_frame拼入Payload
+        if len(states) == 1 or not self.supports(FEATURE_BATCH_STATE):
+            return [({
+                "Type": "SyncState",
+                "Payload": {
+                    "State": self._encode_state(s),
+                }
+            }, [s]) for s in states]
+
+        return [({
+            "Type": "SyncStates",
             "Payload": {
-                **login,
-                "State": json.dumps(payload, cls=JSONEncoder, default=str),
+                "States": self._state_cache.join(self._encode_state(s) for s in states),
             }
-        })
-
-    async def on_device_control(self, jdata):
-        rows = jdata.get("Payload", {}).get("Rows", [])
-        tasks = []
-        for row in rows:
+        }, states)]
+
+    @staticmethod
+    def _merge_control_rows(rows) -> Tuple[List[Tuple[str, str, Dict[str, Any], List[int]]], Dict[int, str]]:
+        """按 (domain, service, 除entity_id外的data) 合并控制行
+
+        返回 (合并后的调用列表[(domain, service, data, 行号列表)], 无效行的错误)。
+        没有entity_id或为all/none的行不合并，单独调用；entity_id格式错误的行合并前就判为失败，
+        不会拖累同组的其他行。
+        """
+        calls: List[Tuple[str, str, Dict[str, Any], List[int]]] = []
+        groups: Dict[Tuple[str, str, bytes], int] = {}
+        errors: Dict[int, str] = {}
+        for idx, row in enumerate(rows):
             try:
-                tasks.append(
-                    self.hass.services.async_call(
-                        row["domain"], row["service"], row.get("data"), blocking=False
-                    )
-                )
-            except Exception:
-                pass
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+                domain, service = row["domain"], row["service"]
+                data = dict(row.get("data") or {})
+            except Exception as e:
+                errors[idx] = f"invalid row: {e}"
+                continue
+            entity_id = data.get("entity_id")
+            if entity_id is None or entity_id in (ENTITY_MATCH_ALL, ENTITY_MATCH_NONE):
+                calls.append((domain, service, data, [idx]))
+                continue
+            row_targets = OptimizedTcpClient._split_entity_ids(entity_id)
+            invalid = [e for e in row_targets if not valid_entity_id(e)]
+            if invalid:
+                errors[idx] = f"invalid entity_id: {invalid[0]!r}"
+                continue
+            del data["entity_id"]
+            key = (domain, service, codec.dumps(data, sort_keys=True))
+            pos = groups.get(key)
+            if pos is None:
+                groups[key] = len(calls)
+                data["entity_id"] = []
+                calls.append((domain, service, data, []))
+                pos = groups[key]
+            merged = calls[pos]
+            targets = merged[2]["entity_id"]
+            for eid in row_targets:
+                if eid not in targets:
+                    targets.append(eid)
+            merged[3].append(idx)
+        # 只有一个目标时保持原来的字符串形式
+        for _, _, data, _ in calls:
+            targets = data.get("entity_id")
+            if isinstance(targets, list) and len(targets) == 1:
+                data["entity_id"] = targets[0]
+        return calls, errors
+
+    async def on_device_control(self, jdata, trace=None):
+        started = time.monotonic()
+        rows = jdata.get("Payload", {}).get("Rows", [])
+        calls, errors = self._merge_control_rows(rows)
+        self.tracer.mark(trace, "dispatched")
+        results = await asyncio.gather(*[
+            self.hass.services.async_call(domain, service, data, blocking=False)
+            for domain, service, data, _ in calls
+        ], return_exceptions=True)
+        self.tracer.mark(trace, "completed")
+
+        # 合并调用的结果回填到每一行
+        row_results: List[Optional[str]] = [None] * len(rows)
+        for idx, error in errors.items():
+            row_results[idx] = error
+        for (domain, service, _, indexes), result in zip(calls, results):
+            error = (str(result) or type(result).__name__) if isinstance(result, Exception) else None
+            if error:
+                LOGGER.warning("Service %s.%s failed: %s", domain, service, error)
+            for idx in indexes:
+                row_results[idx] = error
+        LOGGER.debug("DeviceControl %d rows -> %d service calls", len(rows), len(calls))
+        self.metrics.observe("control_latency", time.monotonic() - started)
+
+        request_id = jdata.get("RequestID")
+        if request_id and self.supports(FEATURE_CONTROL_RESULT):
+            await self.send_message_async({
+                "Type": "DeviceControlResult",
+                "RequestID": request_id,
+                "Payload": {
+                    "Results": codec.dumps_str([
+                        {"success": err is None, "error": err} for err in row_results
+                    ]),
+                },
+            })
 
     async def on_update_entitys(self, jdata):
-        self.entity_ids = jdata.get("Payload", {}).get("entity_ids", [])
+        self.entity_ids = set(jdata.get("Payload", {}).get("entity_ids") or [])
+        self._update_state_listeners(self.entity_ids)
+        self._warm_store.set_entity_ids(self.entity_ids)
 
     async def on_auth(self, jdata):
+        features = jdata.get("Payload", {}).get("Features") or []
+        self._server_features = set(features)
+        LOGGER.info("Server features: %s", sorted(self._server_features))
+        fingerprint = self._state_manager.catalog_fingerprint()
         await self.send_message_async({
             "Type": "Auth",
-            "Payload": self.get_login_info(),
+            "Payload": {
+                "Features": CLIENT_FEATURES,
+                # 与服务器上次拉取时一致则无需重新分页同步目录
+                "CatalogFingerprint": fingerprint,
+            },
         })
+        self._warm_store.set_catalog_fingerprint(fingerprint)
+        self._online = True
+        if self._warm_resync:
+            self._warm_resync = False
+            self._resync_changed_since_last_run()
+        self._resync_dirty()
     
     async def on_error(self, jdata):
         """错误处理"""
@@ -350,6 +764,30 @@ class OptimizedTcpClient:
             jdata.get("RequestID", ""),
         )
     
+    async def on_query_states(self, jdata):
+        """批量查询状态 - 一帧返回多个实体的完整状态，编码结果来自缓存"""
+        entity_ids = jdata.get("Payload", {}).get("entity_ids") or []
+        white_domains = self._state_manager.white_domains
+        encoded, missing = [], []
+        for entity_id in entity_ids[:MAX_QUERY_STATES]:
+            state = self.hass.states.get(entity_id) if isinstance(entity_id, str) else None
+            if state is None or entity_id.split(".", 1)[0] not in white_domains:
+                missing.append(entity_id)
+                continue
+            encoded.append(self._state_cache.encode(state))
+        body = {
+            "Type": "QueryStatesResult",
+            "Payload": {
+                "States": self._state_cache.join(encoded),
+                "Missing": missing,
+                "Truncated": len(entity_ids) > MAX_QUERY_STATES,
+            },
+        }
+        request_id = jdata.get("RequestID")
+        if request_id:
+            body["RequestID"] = request_id
+        await self.send_message_async(body)
+
     def get_login_info(self):
         """获取登录信息"""
         if self._login_info:
@@ -359,8 +797,12 @@ class OptimizedTcpClient:
         self._login_info = {
             "Username": conf.get("username", ""),
             "Password": hashlib.sha1(conf.get("password", "").encode()).hexdigest(),
-            "Version": VERSION,
+            "Version": conf.get("version") or DEFAULT_VERSION,
         }
+        self._login_fragment = codec.encode_login(self._login_info)
+        if self.recorder:
+            self.recorder.set_login_fragment(self._login_fragment, codec.encode_login(
+                {**self._login_info, "Username": "***", "Password": "***"}))
         return self._login_info
     
 
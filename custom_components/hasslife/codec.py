@@ -0,0 +1,86 @@
+"""
+JSON编解码
+有orjson（HA自带）时使用orjson，否则回退到标准库json；登录信息预先编码后按字节拼接。
+外层消息按HA JSONEncoder的规则转换；以字符串承载的内层JSON（State/States/List）
+保持原来json.dumps(default=str)的输出：集合、日期时间等一律str()，服务器端解析不受影响
+"""
+
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - HA环境自带orjson
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """与HA JSONEncoder一致的兜底转换"""
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "as_dict"):
+        return obj.as_dict()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+    _SORTED_OPTIONS = _OPTIONS | orjson.OPT_SORT_KEYS
+
+    # orjson原生编码datetime/dataclass，内层JSON要交给str()处理
+    _STR_OPTIONS = _OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    _SORTED_STR_OPTIONS = _STR_OPTIONS | orjson.OPT_SORT_KEYS
+
+    def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+        return orjson.dumps(obj, default=_default,
+                            option=_SORTED_OPTIONS if sort_keys else _OPTIONS)
+
+    def _dumps_inner(obj: Any, sort_keys: bool) -> bytes:
+        return orjson.dumps(obj, default=str,
+                            option=_SORTED_STR_OPTIONS if sort_keys else _STR_OPTIONS)
+
+    def loads(data) -> Any:
+        """支持bytes/bytearray/memoryview，无需先解码为str"""
+        return orjson.loads(data)
+
+    CODEC_NAME = "orjson"
+else:
+    def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+        return json.dumps(obj, default=_default, sort_keys=sort_keys,
+                          ensure_ascii=False, separators=(",", ":")).encode()
+
+    def _dumps_inner(obj: Any, sort_keys: bool) -> bytes:
+        return json.dumps(obj, default=str, sort_keys=sort_keys,
+                          ensure_ascii=False, separators=(",", ":")).encode()
+
+    def loads(data) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    CODEC_NAME = "json"
+
+
+def dumps_str(obj: Any, sort_keys: bool = False) -> str:
+    """编码为str，用于协议中以字符串承载的JSON字段（State/States/List），非原生类型一律str()"""
+    return _dumps_inner(obj, sort_keys).decode()
+
+
+def encode_login(login: Dict[str, Any]) -> bytes:
+    """预编码登录信息，得到可直接拼入Payload的片段（不含外层花括号）"""
+    return dumps(login)[1:-1]
+
+
+def encode_message(message: Dict[str, Any], login: bytes) -> bytes:
+    """编码一条消息 - Payload中自动拼入预编码的登录信息"""
+    parts = []
+    for key, value in message.items():
+        if key == "Payload":
+            fields = dumps(value)[1:-1] if value else b""
+            payload = login + b"," + fields if fields else login
+            parts.append(b'"Payload":{' + payload + b"}")
+        else:
+            parts.append(dumps(key) + b":" + dumps(value))
+    return b"{" + b",".join(parts) + b"}"
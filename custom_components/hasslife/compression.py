@@ -0,0 +1,95 @@
+"""
+帧压缩
+协商Zlib能力后，超过阈值的消息体用zlib + 预置字典压缩，通过32字节头中的空闲字节标记
+
+帧头布局（小端）：
+    0-3   消息体长度（压缩后）
+    4     标志位，bit0 = zlib压缩
+    5     预置字典编号，0表示不使用字典
+    6-7   保留
+    8-11  压缩前长度
+    12-31 保留，填0
+未压缩的帧与原协议完全一致（只有长度，其余为0）。
+"""
+
+import struct
+import zlib
+from typing import Tuple
+
+HEADER_LEN = 32
+FLAG_ZLIB = 0x01
+
+COMPRESS_THRESHOLD = 512
+COMPRESS_LEVEL = 6
+
+_HEADER = struct.Struct("<IBBxxI")
+
+# 常见的HA属性键和取值。状态内容以JSON字符串承载在外层JSON中，绝大部分是转义形式，
+# zlib优先匹配字典末尾的内容，所以最常见的放在最后
+_COMMON_VALUES = [
+    "unavailable", "unknown", "heat_cool", "fan_only", "dry", "cool", "heat", "auto",
+    "idle", "playing", "paused", "open", "closed", "opening", "closing",
+    "mdi:", "brightness", "color_temp", "hs", "xy", "rgb", "onoff",
+]
+_COMMON_KEYS = [
+    "last_changed", "last_updated", "context", "restored", "assumed_state",
+    "entity_picture", "media_content_type", "media_content_id", "media_duration",
+    "media_position_updated_at", "media_position", "media_title", "media_artist",
+    "app_name", "sound_mode_list", "sound_mode", "source_list", "source",
+    "is_volume_muted", "volume_level", "preset_modes", "preset_mode",
+    "swing_modes", "swing_mode", "fan_modes", "fan_mode", "hvac_action",
+    "hvac_modes", "target_temp_step", "target_temp_high", "target_temp_low",
+    "min_temp", "max_temp", "current_humidity", "current_temperature", "temperature",
+    "current_tilt_position", "current_position", "percentage_step", "percentage",
+    "oscillating", "direction", "effect_list", "effect", "min_mireds", "max_mireds",
+    "min_color_temp_kelvin", "max_color_temp_kelvin", "color_temp_kelvin",
+    "xy_color", "rgb_color", "hs_color", "color_mode", "supported_color_modes",
+    "unit_of_measurement", "device_class", "icon", "supported_features",
+    "brightness", "friendly_name", "attributes", "state", "entity_id",
+]
+
+
+def _build_dictionary() -> bytes:
+    parts = [b'"Username":"', b'","Password":"', b'","Version":"', b'"State":"', b'"States":"',
+             b'"List":"']
+    parts += [f'\\"{value}\\"'.encode() for value in _COMMON_VALUES]
+    parts += [f'\\"{key}\\":'.encode() for key in _COMMON_KEYS]
+    parts += [b'\\"state\\":\\"off\\"', b'\\"state\\":\\"on\\"', b'{\\"attributes\\":{']
+    return b"".join(parts)
+
+
+# 字典编号 -> 字典内容，服务器需要持有相同的字典；新增字典只能追加编号
+DICTIONARIES = {
+    1: _build_dictionary(),
+}
+DEFAULT_DICTIONARY = 1
+
+
+def pack_header(size: int, flags: int = 0, dict_id: int = 0, raw_size: int = 0) -> bytes:
+    return _HEADER.pack(size, flags, dict_id, raw_size).ljust(HEADER_LEN, b"\x00")
+
+
+def unpack_header(header, offset: int = 0) -> Tuple[int, int, int, int]:
+    """返回 (长度, 标志位, 字典编号, 压缩前长度)"""
+    return _HEADER.unpack_from(header, offset)
+
+
+def compress(body: bytes, dict_id: int = DEFAULT_DICTIONARY) -> bytes:
+    zdict = DICTIONARIES.get(dict_id)
+    if zdict is None:
+        compressor = zlib.compressobj(COMPRESS_LEVEL)
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zdict=zdict)
+    return compressor.compress(body) + compressor.flush()
+
+
+def decompress(data, dict_id: int, max_size: int) -> bytes:
+    """解压，超过max_size视为非法帧"""
+    zdict = DICTIONARIES.get(dict_id) if dict_id else None
+    if dict_id and zdict is None:
+        raise ValueError(f"unknown compression dictionary: {dict_id}")
+    decompressor = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    body = decompressor.decompress(data, max_size)
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise ValueError("invalid compressed frame")
+    return body
@@ -0,0 +1,219 @@
+"""
+多服务器连接管理
+缓存DNS解析结果，按 健康状况/RTT/配置顺序 排列服务器，错开启动多个连接尝试（Happy Eyeballs），
+第一个成功的连接胜出，其余取消；单个服务器故障时立即尝试下一个，不等待退避
+"""
+
+import asyncio
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .utils import LOGGER
+
+CONNECT_TIMEOUT = 5           # 单次连接尝试超时（秒）
+ATTEMPT_DELAY = 0.25          # 上一个尝试未完成时，多久后启动下一个（RFC 8305推荐250ms）
+DNS_TTL = 300                 # 解析结果缓存时间，解析失败时继续使用过期结果
+FAILURE_COOLDOWN = 30         # 失败后排到队尾的时长，连续失败翻倍
+MAX_FAILURE_COOLDOWN = 300
+RTT_ALPHA = 0.25              # RTT平滑系数
+
+# (IP, 端口, 地址族) -> (reader, writer)
+Opener = Callable[[str, int, int], Awaitable[Tuple[Any, Any]]]
+
+
+class Endpoint:
+    """一个服务器地址及其健康状况"""
+
+    __slots__ = ("host", "port", "index", "rtt", "failures", "down_until", "connects")
+
+    def __init__(self, host: str, port: int, index: int):
+        self.host = host
+        self.port = port
+        self.index = index
+        self.rtt: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.connects = 0
+
+    def __repr__(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "endpoint": repr(self),
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "failures": self.failures,
+            "connects": self.connects,
+        }
+
+
+def _interleave(infos: List[tuple]) -> List[tuple]:
+    """IPv6/IPv4交替排列，保持各自原有顺序"""
+    by_family: Dict[int, List[tuple]] = {}
+    for info in infos:
+        by_family.setdefault(info[0], []).append(info)
+    queues = list(by_family.values())
+    result = []
+    while queues:
+        for queue in list(queues):
+            result.append(queue.pop(0))
+            if not queue:
+                queues.remove(queue)
+    return result
+
+
+def parse_endpoints(value: Iterable[Any], default_port: int) -> List[Tuple[str, int]]:
+    """解析配置中的服务器列表：每项为 "host:port"、"[IPv6]:port"、"host"（使用默认端口）或 [host, port]"""
+    endpoints = []
+    for item in value:
+        if isinstance(item, str):
+            host, sep, port = item.rpartition(":")
+            if not sep or (":" in host and not host.endswith("]")):
+                # 没有端口，或是IPv6地址（带端口时需写成[addr]:port）
+                host, port = item, default_port
+            endpoints.append((host.strip("[]"), int(port)))
+        else:
+            host, port = item
+            endpoints.append((str(host), int(port)))
+    return endpoints
+
+
+class ConnectionManager:
+    """服务器列表 + DNS缓存 + 竞速连接"""
+
+    def __init__(self, endpoints: Iterable[Tuple[str, int]],
+                 connect_timeout: float = CONNECT_TIMEOUT, attempt_delay: float = ATTEMPT_DELAY,
+                 dns_ttl: float = DNS_TTL, clock: Callable[[], float] = time.monotonic):
+        self.endpoints = [Endpoint(host, int(port), idx) for idx, (host, port) in enumerate(endpoints)]
+        if not self.endpoints:
+            raise ValueError("no endpoints configured")
+        self.connect_timeout = connect_timeout
+        self.attempt_delay = attempt_delay
+        self.dns_ttl = dns_ttl
+        self._clock = clock
+        # (host, port) -> (过期时间, getaddrinfo结果)
+        self._dns_cache: Dict[Tuple[str, int], Tuple[float, List[tuple]]] = {}
+
+    def ordered(self) -> List[Endpoint]:
+        """未处于故障冷却的优先，其次RTT低的优先，未测过RTT的按配置顺序排在后面"""
+        now = self._clock()
+        return sorted(self.endpoints, key=lambda e: (
+            e.down_until > now,
+            e.rtt is None,
+            e.rtt or 0.0,
+            e.index,
+        ))
+
+    async def _resolve(self, endpoint: Endpoint) -> List[tuple]:
+        key = (endpoint.host, endpoint.port)
+        cached = self._dns_cache.get(key)
+        now = self._clock()
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                endpoint.host, endpoint.port, type=socket.SOCK_STREAM
+            )
+        except OSError as e:
+            if cached:
+                LOGGER.warning("Resolve %s failed, using cached addresses: %s", endpoint, e)
+                return cached[1]
+            raise
+        infos = _interleave(infos)
+        self._dns_cache[key] = (now + self.dns_ttl, infos)
+        return infos
+
+    async def _candidates(self) -> List[Tuple[Endpoint, str, int, int]]:
+        """按优先级展开为 (服务器, IP, 端口, 地址族) 列表"""
+        endpoints = self.ordered()
+        results = await asyncio.gather(*[self._resolve(e) for e in endpoints], return_exceptions=True)
+        candidates = []
+        for endpoint, infos in zip(endpoints, results):
+            if isinstance(infos, Exception):
+                LOGGER.warning("Resolve %s failed: %s", endpoint, infos)
+                self.mark_failed(endpoint)
+                continue
+            for family, _, _, _, sockaddr in infos:
+                candidates.append((endpoint, sockaddr[0], sockaddr[1], family))
+        return candidates
+
+    async def _attempt(self, candidate, opener: Opener):
+        endpoint, ip, port, family = candidate
+        started = self._clock()
+        async with asyncio.timeout(self.connect_timeout):
+            result = await opener(ip, port, family)
+        self.observe_rtt(endpoint, self._clock() - started)
+        return result
+
+    async def connect(self, opener: Opener) -> Tuple[Tuple[Any, Any], Endpoint]:
+        """竞速连接，返回 ((reader, writer), 服务器)；全部失败时抛出最后一个错误"""
+        candidates = await self._candidates()
+        if not candidates:
+            raise ConnectionError("no resolvable endpoint")
+        pending: Dict[asyncio.Task, tuple] = {}
+        failed = set()
+        last_error: Optional[BaseException] = None
+        winner = None
+        remaining = iter(candidates)
+        try:
+            while True:
+                # 每轮启动一个新尝试：上一轮等待超时（都还在进行）或有尝试失败时都会走到这里
+                candidate = next(remaining, None)
+                if candidate is not None:
+                    pending[asyncio.create_task(self._attempt(candidate, opener))] = candidate
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.attempt_delay if candidate is not None else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    endpoint = pending.pop(task)[0]
+                    if task.exception() is None:
+                        winner = (task.result(), endpoint)
+                        break
+                    last_error = task.exception()
+                    failed.add(endpoint)
+                    LOGGER.debug("Connect %s failed: %s", endpoint, last_error)
+                if winner:
+                    break
+        finally:
+            await self._cancel_losers(pending)
+
+        for endpoint in failed:
+            if winner is None or endpoint is not winner[1]:
+                self.mark_failed(endpoint)
+        if winner is None:
+            raise last_error or ConnectionError("all endpoints failed")
+        endpoint = winner[1]
+        endpoint.failures = 0
+        endpoint.down_until = 0.0
+        endpoint.connects += 1
+        return winner
+
+    @staticmethod
+    async def _cancel_losers(pending: Dict[asyncio.Task, tuple]):
+        """取消未完成的尝试，关闭取消前恰好已建立的连接"""
+        if not pending:
+            return
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending)
+        for task in pending:
+            if not task.cancelled() and task.exception() is None:
+                task.result()[1].close()
+
+    def mark_failed(self, endpoint: Endpoint):
+        endpoint.failures += 1
+        cooldown = min(FAILURE_COOLDOWN * 2 ** (endpoint.failures - 1), MAX_FAILURE_COOLDOWN)
+        endpoint.down_until = self._clock() + cooldown
+
+    def observe_rtt(self, endpoint: Endpoint, rtt: float):
+        if endpoint.rtt is None:
+            endpoint.rtt = rtt
+        else:
+            endpoint.rtt += RTT_ALPHA * (rtt - endpoint.rtt)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        return [e.as_dict() for e in self.ordered()]
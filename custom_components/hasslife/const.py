@@ -2,19 +2,17 @@
 import os
 import json
 
+DEFAULT_VERSION = '3.6'
+
 def get_version():
-    """从manifest.json获取插件版本号"""
+    """从manifest.json获取插件版本号 - 同步读文件，不要在事件循环中直接调用"""
     try:
         manifest_path = os.path.join(os.path.dirname(__file__), 'manifest.json')
         with open(manifest_path, 'r') as f:
             manifest = json.load(f)
-            return manifest.get('version', '3.6')
+            return manifest.get('version', DEFAULT_VERSION)
     except Exception:
-        return '3.6'
-
-# 版本号统一从manifest.json获取
-VERSION = get_version()
-CLIENT_VERSION = VERSION
+        return DEFAULT_VERSION
 
 BUFFER_SIZE = 1024
 CONNECTED = 1
@@ -36,3 +34,21 @@ CLIENT_STATUS_BINDED = "binded"
 CONFIG_FILE_NAME = "hasslife_config.yaml"
 
 TCP_CONNECTION_ACTIVATE_TIME = 60
+
+# 启动及断线后首次连接前的随机延迟上限（秒），避免大量客户端同时连接，可用connect_jitter配置
+CONNECT_JITTER = 2.0
+
+# 协议能力协商：客户端在Auth应答中声明，服务器在Auth请求中回告支持的能力
+FEATURE_BATCH_STATE = "BatchState"
+FEATURE_ATTR_DELTA = "AttrDelta"
+FEATURE_CONTROL_RESULT = "ControlResult"
+FEATURE_ZLIB = "Zlib"
+FEATURE_QUERY_STATES = "QueryStates"
+CLIENT_FEATURES = [FEATURE_BATCH_STATE, FEATURE_ATTR_DELTA, FEATURE_CONTROL_RESULT, FEATURE_ZLIB,
+                   FEATURE_QUERY_STATES]
+
+# 单次QueryStates最多返回的实体数
+MAX_QUERY_STATES = 500
+
+# 属性增量上报时，每个实体至少每隔多少秒发送一次完整快照
+FULL_SNAPSHOT_INTERVAL = 300
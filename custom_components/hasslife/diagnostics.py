@@ -0,0 +1,23 @@
+"""Diagnostics support for HassLife."""
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from . import DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> Dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN].get(entry.entry_id, {})
+    client = data.get("client")
+    return {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "client": client.get_diagnostics() if client else None,
+    }
@@ -0,0 +1,66 @@
+"""
+入站消息分发
+接收协程只负责持续读帧，耗时的处理函数作为有界并发任务执行
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Set
+
+from .utils import LOGGER
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+MAX_IN_FLIGHT = 32
+
+
+class InboundDispatcher:
+    """有界并发分发器
+
+    同一个key（如entity_id）的任务按到达顺序串行执行，不同key之间并发；
+    同时执行的任务数达到上限时，dispatch会等待空位，从而对读取形成背压。
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        # key -> 该key最后一个任务，新任务需等它完成
+        self._tails: Dict[str, asyncio.Task] = {}
+
+    async def dispatch(self, handler: Handler, jdata: Dict[str, Any], keys: Iterable[str] = ()):
+        await self._slots.acquire()
+        keys = tuple(keys)
+        waits = {self._tails[k] for k in keys if k in self._tails}
+        task = asyncio.create_task(self._run(handler, jdata, waits))
+        for key in keys:
+            self._tails[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._on_done(t, keys))
+
+    async def _run(self, handler: Handler, jdata: Dict[str, Any], waits):
+        if waits:
+            await asyncio.wait(waits)
+        try:
+            await handler(jdata)
+        except Exception as e:
+            LOGGER.error("Handler for %s failed: %s", jdata.get("Type"), e)
+
+    def _on_done(self, task: asyncio.Task, keys):
+        # 完成回调一定会执行（包括任务在开始前被取消），在这里归还并发名额
+        self._slots.release()
+        self._tasks.discard(task)
+        for key in keys:
+            if self._tails.get(key) is task:
+                del self._tails[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def cancel_all(self):
+        """连接断开时取消所有未完成的处理任务"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,163 @@
+"""
+上报显著性过滤
+按 domain/属性 配置忽略、数值死区和最小间隔，过滤无意义的高频属性抖动
+"""
+
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from homeassistant.core import State
+
+# 规则字段：
+#   ignore        该属性变化本身不触发上报
+#   deadband      数值与上次上报值之差小于该值时不触发上报
+#   min_interval  距该属性上次上报不足该秒数时不触发上报
+# 被抑制的变化不会丢失，实体下一次上报时会带上最新值；
+# 只因min_interval被抑制的变化，会在间隔到期时补一次尾随上报（见pop_trailing）
+DEFAULT_POLICY: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "media_player": {
+        "media_position": {"ignore": True},
+        "media_position_updated_at": {"ignore": True},
+    },
+    "climate": {
+        "current_temperature": {"deadband": 0.5},
+        "current_humidity": {"deadband": 2},
+    },
+    "water_heater": {
+        "current_temperature": {"deadband": 0.5},
+    },
+    "humidifier": {
+        "current_humidity": {"deadband": 2},
+    },
+    "switch": {
+        "current_power_w": {"deadband": 5, "min_interval": 30},
+        "current_a": {"deadband": 0.1, "min_interval": 30},
+        "voltage": {"deadband": 5, "min_interval": 60},
+        "today_energy_kwh": {"min_interval": 300},
+        "total_energy_kwh": {"min_interval": 300},
+    },
+    "vacuum": {
+        "battery_level": {"deadband": 5},
+    },
+    "automation": {
+        "last_triggered": {"min_interval": 60},
+    },
+    "script": {
+        "last_triggered": {"min_interval": 60},
+    },
+}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class SignificanceFilter:
+    """显著性过滤器 - 状态值变化总是上报，属性变化按规则判断"""
+
+    def __init__(self, overrides: Optional[Mapping[str, Mapping[str, Mapping[str, Any]]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.policy: Dict[str, Dict[str, Dict[str, Any]]] = {
+            domain: dict(rules) for domain, rules in DEFAULT_POLICY.items()
+        }
+        for domain, rules in (overrides or {}).items():
+            self.policy.setdefault(domain, {}).update(rules)
+        # entity_id -> {属性: 上次上报值}
+        self._anchors: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        # entity_id -> {属性: 上次上报时间}
+        self._reported_at: Dict[str, Dict[str, float]] = defaultdict(dict)
+        # "domain.attr:rule" -> 抑制次数
+        self.suppressed: Dict[str, int] = defaultdict(int)
+        # entity_id -> 尾随上报时间
+        self._trailing: Dict[str, float] = {}
+
+    def should_report(self, entity_id: str, old_state: Optional[State], new_state: State) -> bool:
+        if old_state is None or old_state.state != new_state.state:
+            self._mark_reported(entity_id, new_state.attributes)
+            return True
+
+        old_attrs = old_state.attributes or {}
+        new_attrs = new_state.attributes or {}
+        if old_attrs == new_attrs:
+            return False
+
+        rules = self.policy.get(entity_id.split(".", 1)[0])
+        if not rules:
+            self._mark_reported(entity_id, new_attrs)
+            return True
+
+        now = self._clock()
+        anchors = self._anchors[entity_id]
+        reported_at = self._reported_at[entity_id]
+        suppressed = []
+        trailing_at = None
+        for key in set(old_attrs).union(new_attrs):
+            old_value, new_value = old_attrs.get(key), new_attrs.get(key)
+            if old_value == new_value:
+                continue
+            rule = rules.get(key)
+            if not rule:
+                self._mark_reported(entity_id, new_attrs)
+                return True
+            reason = self._suppress_reason(rule, key, anchors, reported_at, old_value, new_value, now)
+            if reason is None:
+                self._mark_reported(entity_id, new_attrs)
+                return True
+            suppressed.append(f"{entity_id.split('.', 1)[0]}.{key}:{reason}")
+            if reason == "min_interval":
+                # 所有被限频的属性都到期后再补报
+                due = reported_at.get(key, now) + rule["min_interval"]
+                trailing_at = due if trailing_at is None else max(trailing_at, due)
+
+        for name in suppressed:
+            self.suppressed[name] += 1
+        if trailing_at is not None:
+            self._trailing[entity_id] = trailing_at
+        return False
+
+    def pop_trailing(self, entity_id: str) -> Optional[float]:
+        """should_report返回False后调用：需要尾随上报时返回上报时间"""
+        return self._trailing.pop(entity_id, None)
+
+    @staticmethod
+    def _suppress_reason(rule, key, anchors, reported_at, old_value, new_value, now) -> Optional[str]:
+        """返回抑制原因，None表示该变化需要上报"""
+        if rule.get("ignore"):
+            return "ignore"
+        deadband = rule.get("deadband")
+        if deadband is not None:
+            anchor = anchors.get(key, old_value)
+            if _is_number(anchor) and _is_number(new_value) and abs(new_value - anchor) < deadband:
+                return "deadband"
+        min_interval = rule.get("min_interval")
+        if min_interval is not None and now - reported_at.get(key, float("-inf")) < min_interval:
+            return "min_interval"
+        return None
+
+    def mark_reported(self, entity_id: str, attributes: Mapping[str, Any]):
+        """实际上报时调用（包括尾随上报），以上报内容为新基准"""
+        self._trailing.pop(entity_id, None)
+        self._mark_reported(entity_id, attributes)
+
+    def _mark_reported(self, entity_id: str, attributes: Mapping[str, Any]):
+        """一次上报会带上全部属性，所有有规则的属性都以当前值为新基准"""
+        rules = self.policy.get(entity_id.split(".", 1)[0])
+        if not rules:
+            return
+        now = self._clock()
+        anchors = self._anchors[entity_id]
+        reported_at = self._reported_at[entity_id]
+        for key in rules:
+            if key in attributes:
+                anchors[key] = attributes[key]
+                reported_at[key] = now
+
+    def forget(self, entity_id: str):
+        self._anchors.pop(entity_id, None)
+        self._reported_at.pop(entity_id, None)
+        self._trailing.pop(entity_id, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self.suppressed)
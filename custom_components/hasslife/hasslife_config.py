@@ -10,7 +10,11 @@ class HassLifeConfigs:
         'server': {
             'host': "192.168.199.9",
             'port': 4443,
-            'bufsize': 1024
+            'bufsize': 1024,
+            'transport': 'stream',
+            'endpoints': [
+                ("192.168.199.9", 4443),
+            ]
         }
     }
 
@@ -18,7 +22,12 @@ class HassLifeConfigs:
         'server': {
             'host': "server.blear.cn",
             'port': 4448,
-            'bufsize': 1024
+            'bufsize': 1024,
+            'transport': 'stream',
+            # 按顺序作为初始优先级，连接后按RTT和故障情况调整
+            'endpoints': [
+                ("server.blear.cn", 4448),
+            ]
         }
     }
 
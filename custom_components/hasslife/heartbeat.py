@@ -0,0 +1,157 @@
+"""
+自适应心跳
+双向都有近期流量时不发Ping；空闲链路逐步拉长Ping间隔；Ping写出后短超时判定断线。
+Ping入队到写出之间、以及drain未完成时不计超时，发送端拥塞不会被误判为断线。
+RTT由Ping/Pong配对测量，按TCP的方式平滑。
+"""
+
+import socket
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .utils import LOGGER
+
+HEARTBEAT_INTERVAL = 10      # 有业务流量时的Ping间隔（秒）
+HEARTBEAT_MAX_INTERVAL = 30  # 空闲链路最长Ping间隔，需小于服务器的空闲断开时间
+HEARTBEAT_BACKOFF = 1.5
+PONG_TIMEOUT = 10            # Ping写出后这么久没有任何下行即判定断线
+IDLE_TIMEOUT = 60            # 兜底：这么久没有任何下行即判定断线
+
+# TCP keepalive 参数，业务心跳之外由内核探测半开连接
+KEEPALIVE_IDLE = 30
+KEEPALIVE_INTERVAL = 10
+KEEPALIVE_COUNT = 3
+PENDING_POLL_INTERVAL = 1    # Ping排队或drain进行中时的检查间隔
+USER_TIMEOUT_MS = 30000      # 已发送数据超过这么久未被确认即断开（Linux）
+
+ACTION_WAIT = "wait"
+ACTION_PING = "ping"
+ACTION_DEAD = "dead"
+
+
+class AdaptiveHeartbeat:
+    """心跳策略 - 只负责计时和判定，Ping由客户端发送"""
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL,
+                 max_interval: float = HEARTBEAT_MAX_INTERVAL,
+                 pong_timeout: float = PONG_TIMEOUT, idle_timeout: float = IDLE_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.pong_timeout = pong_timeout
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self.pings_sent = 0
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.reset()
+
+    def reset(self):
+        """新连接建立"""
+        now = self._clock()
+        self.last_sent = now
+        self.last_received = now
+        self.ping_sent_at: Optional[float] = None
+        self.ping_queued = False
+        self.drain_started_at: Optional[float] = None
+        self.current_interval = self.interval
+        self._active = True
+
+    def on_drain_start(self):
+        self.drain_started_at = self._clock()
+
+    def on_sent(self, ping: bool = False):
+        """一次写出完成（drain返回）；ping表示这次写出包含Ping，从此刻开始计Pong超时"""
+        now = self._clock()
+        self.last_sent = now
+        self.drain_started_at = None
+        if ping and self.ping_queued:
+            self.ping_queued = False
+            self.ping_sent_at = now
+
+    def on_received(self):
+        self.last_received = self._clock()
+
+    def on_activity(self):
+        """心跳以外的收发 - 链路在用，恢复基础间隔"""
+        self._active = True
+        self.current_interval = self.interval
+
+    def on_ping_queued(self):
+        """Ping已入队，写出后由on_sent(ping=True)开始计时"""
+        self.ping_queued = True
+        self.pings_sent += 1
+        if not self._active:
+            # 上次Ping以来只有心跳，逐步拉长间隔
+            self.current_interval = min(self.current_interval * HEARTBEAT_BACKOFF, self.max_interval)
+        self._active = False
+
+    def on_pong(self) -> Optional[float]:
+        """返回本次RTT样本"""
+        if self.ping_sent_at is None:
+            return None
+        sample = self._clock() - self.ping_sent_at
+        self.ping_sent_at = None
+        if self.srtt is None:
+            self.srtt, self.rttvar = sample, sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        return sample
+
+    def poll(self) -> Tuple[str, float]:
+        """返回 (动作, 距下次检查的秒数)"""
+        now = self._clock()
+        drain_started_at = self.drain_started_at
+        if drain_started_at is not None:
+            # 数据还没写出去，下行安静不能说明链路断了；drain本身卡住过久才判定断线
+            if now - drain_started_at >= self.idle_timeout:
+                return ACTION_DEAD, 0.0
+            return ACTION_WAIT, PENDING_POLL_INTERVAL
+        if now - self.last_received >= self.idle_timeout:
+            return ACTION_DEAD, 0.0
+        if self.ping_queued:
+            # Ping还在发送队列中，等它写出
+            return ACTION_WAIT, PENDING_POLL_INTERVAL
+        ping_sent_at = self.ping_sent_at
+        if ping_sent_at is not None and self.last_received < ping_sent_at:
+            # Ping之后任何下行都能证明链路可用，否则在短超时后判定断线
+            deadline = ping_sent_at + self.pong_timeout
+            if now >= deadline:
+                return ACTION_DEAD, 0.0
+            return ACTION_WAIT, deadline - now
+        # 较久未有流量的方向安静了current_interval才发Ping
+        quiet = now - min(self.last_sent, self.last_received)
+        if quiet >= self.current_interval:
+            return ACTION_PING, 0.0
+        return ACTION_WAIT, self.current_interval - quiet
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interval": self.current_interval,
+            "pings_sent": self.pings_sent,
+            "srtt_ms": round(self.srtt * 1000, 1) if self.srtt is not None else None,
+            "rttvar_ms": round(self.rttvar * 1000, 1) if self.rttvar is not None else None,
+            "awaiting_pong": self.ping_sent_at is not None,
+            "ping_queued": self.ping_queued,
+            "drain_pending": self.drain_started_at is not None,
+        }
+
+
+def enable_tcp_keepalive(sock):
+    """开启TCP keepalive，平台不支持的选项跳过"""
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for name, value in (
+            ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+            ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+            ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+            ("TCP_USER_TIMEOUT", USER_TIMEOUT_MS),
+        ):
+            option = getattr(socket, name, None)
+            if option is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
+    except OSError as e:
+        LOGGER.debug("Enable TCP keepalive failed: %s", e)
@@ -0,0 +1,94 @@
+"""
+运行时指标
+计数器 + 固定分桶直方图，记录开销只有一次整数累加和一次二分查找，可在生产环境常开
+"""
+
+import bisect
+from typing import Any, Dict, Sequence
+
+# 时间类直方图分桶上界（秒）
+TIME_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 队列深度分桶上界
+DEPTH_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Histogram:
+    """固定分桶直方图，分位数按桶上界近似"""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Sequence[float] = TIME_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, num in enumerate(self.counts):
+            seen += num
+            if seen >= rank and num:
+                return self.bounds[idx] if idx < len(self.bounds) else self.max
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+COUNTERS = (
+    "frames_sent", "bytes_sent", "flushes",
+    # 压缩前的帧字节数；参与压缩的消息体压缩前后字节数和实际压缩发送的帧数
+    "raw_bytes_sent", "compress_in_bytes", "compress_out_bytes", "compressed_frames",
+    "frames_received", "bytes_received",
+    "reconnects",
+)
+
+HISTOGRAMS = {
+    "queue_depth": DEPTH_BUCKETS,
+    "encode_time": TIME_BUCKETS,
+    "compress_time": TIME_BUCKETS,
+    "drain_time": TIME_BUCKETS,
+    "reconnect_duration": TIME_BUCKETS,
+    "heartbeat_rtt": TIME_BUCKETS,
+    "control_latency": TIME_BUCKETS,
+}
+
+
+class ClientMetrics:
+    """客户端指标集合"""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        self.histograms: Dict[str, Histogram] = {
+            name: Histogram(bounds) for name, bounds in HISTOGRAMS.items()
+        }
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def observe(self, name: str, value: float):
+        self.histograms[name].observe(value)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "counters": dict(self.counters),
+            "histograms": {name: h.as_dict() for name, h in self.histograms.items()},
+        }
@@ -0,0 +1,181 @@
+"""
+出站消息调度
+按优先级分道排队，所有写入都由唯一的发送协程从这里取消息
+"""
+
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from homeassistant.core import State
+
+LANE_CONTROL = 0  # 协议控制：Auth、Ping
+LANE_RESPONSE = 1  # 请求应答：SyncDevice
+LANE_BULK = 2  # 批量状态上报：SyncState/SyncStates
+
+LANE_NAMES = ("control", "response", "bulk")
+
+# 消息类型 -> 通道，未列出的归入批量通道
+LANE_BY_TYPE = {
+    "Auth": LANE_CONTROL,
+    "Ping": LANE_CONTROL,
+    "SyncDevice": LANE_RESPONSE,
+    "DeviceControlResult": LANE_RESPONSE,
+    "QueryStatesResult": LANE_RESPONSE,
+}
+
+DEFAULT_LANE_BOUNDS = (100, 200, 1000)
+
+# 状态上报在发送时才编码，每次最多合并的实体数
+STATE_BATCH_SIZE = 50
+
+# 返回 [(消息, 该消息携带的状态)]
+StateFrameBuilder = Callable[[List[State]], List[Tuple[Dict[str, Any], List[State]]]]
+
+
+class OutboundScheduler:
+    """多通道出站队列
+
+    控制通道严格优先；应答通道与批量通道按权重轮转，
+    批量通道有积压时，每连续发送response_weight条应答至少让出一次。
+
+    状态上报按entity_id只保留最新值，轮到批量通道时才交给
+    state_builder编码成帧，因此积压再多也不会为同一实体保留两个旧状态；
+    超出上限被挤掉的实体交给on_state_dropped，由客户端记脏稍后补发。
+    编码后的状态帧在发送协程确认写出（ack）之前一直登记在案，
+    断线时连同排队中的状态一起由take_states交还，不会丢失。
+    """
+
+    def __init__(self, bounds=DEFAULT_LANE_BOUNDS, response_weight: int = 4,
+                 state_builder: Optional[StateFrameBuilder] = None,
+                 state_batch_size: int = STATE_BATCH_SIZE,
+                 on_state_dropped: Optional[Callable[[str], None]] = None):
+        self._lanes: List[Deque[Dict[str, Any]]] = [deque() for _ in LANE_NAMES]
+        self.bounds = tuple(bounds)
+        self.response_weight = response_weight
+        self._response_streak = 0
+        self._ready = asyncio.Event()
+        self.dropped = [0] * len(LANE_NAMES)
+
+        # entity_id -> 最新待上报状态，保持首次入队顺序
+        self._states: "OrderedDict[str, State]" = OrderedDict()
+        self.state_builder = state_builder
+        self.state_batch_size = state_batch_size
+        self.on_state_dropped = on_state_dropped
+        self.states_replaced = 0
+        self.states_dropped = 0
+        # 已编码但尚未确认写出的状态帧：id(消息) -> (消息, 状态)
+        self._unacked: Dict[int, Tuple[Dict[str, Any], List[State]]] = {}
+
+    @staticmethod
+    def lane_for(message: Dict[str, Any]) -> int:
+        return LANE_BY_TYPE.get(message.get("Type"), LANE_BULK)
+
+    def put_nowait(self, message: Dict[str, Any], lane: Optional[int] = None) -> bool:
+        """非阻塞入队，通道已满时丢弃并返回False"""
+        if lane is None:
+            lane = self.lane_for(message)
+        queue = self._lanes[lane]
+        if len(queue) >= self.bounds[lane]:
+            self.dropped[lane] += 1
+            return False
+        queue.append(message)
+        self._ready.set()
+        return True
+
+    def put_state(self, state: State):
+        """非阻塞登记状态上报：同一实体已在排队时原位替换为最新值，超出上限时挤掉最旧的"""
+        entity_id = state.entity_id
+        states = self._states
+        if entity_id in states:
+            self.states_replaced += 1
+        elif len(states) >= self.bounds[LANE_BULK]:
+            dropped_id, _ = states.popitem(last=False)
+            self.states_dropped += 1
+            if self.on_state_dropped:
+                self.on_state_dropped(dropped_id)
+        states[entity_id] = state
+        self._ready.set()
+
+    def take_states(self) -> List[str]:
+        """取走所有未确认写出的状态上报（排队中、已编码未发送、发送中），返回其entity_id"""
+        entity_ids = list(self._states)
+        for _, states in self._unacked.values():
+            entity_ids.extend(s.entity_id for s in states)
+        self._states.clear()
+        self._unacked.clear()
+        return entity_ids
+
+    def ack(self, messages: Iterable[Dict[str, Any]]) -> List[State]:
+        """发送协程写出成功后确认，返回这些消息携带的状态"""
+        flushed: List[State] = []
+        unacked = self._unacked
+        for message in messages:
+            entry = unacked.pop(id(message), None)
+            if entry is not None:
+                flushed.extend(entry[1])
+        return flushed
+
+    def _build_states(self):
+        """把排队的状态编码为批量通道的消息"""
+        batch = []
+        while self._states and len(batch) < self.state_batch_size:
+            batch.append(self._states.popitem(last=False)[1])
+        bulk = self._lanes[LANE_BULK]
+        for message, states in self.state_builder(batch):
+            self._unacked[id(message)] = (message, states)
+            bulk.append(message)
+
+    def get_nowait(self) -> Optional[Dict[str, Any]]:
+        """按优先级取出一条消息，没有则返回None"""
+        control, response, bulk = self._lanes
+        if control:
+            return control.popleft()
+        has_bulk = bool(bulk or self._states)
+        if response and (not has_bulk or self._response_streak < self.response_weight):
+            self._response_streak += 1
+            return response.popleft()
+        if has_bulk:
+            self._response_streak = 0
+            if not bulk:
+                self._build_states()
+            if bulk:
+                return bulk.popleft()
+        if response:
+            # 排队的状态编码后为空（如已取消订阅），不能因此让应答等到下次唤醒
+            self._response_streak += 1
+            return response.popleft()
+        return None
+
+    async def get(self) -> Dict[str, Any]:
+        while True:
+            message = self.get_nowait()
+            if message is not None:
+                return message
+            self._ready.clear()
+            await self._ready.wait()
+
+    def empty(self) -> bool:
+        return not (self._states or any(self._lanes))
+
+    def qsize(self) -> int:
+        return len(self._states) + sum(len(q) for q in self._lanes)
+
+    def clear(self):
+        for queue in self._lanes:
+            queue.clear()
+        self._states.clear()
+        self._unacked.clear()
+        self._response_streak = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            name: {"depth": len(self._lanes[i]), "dropped": self.dropped[i]}
+            for i, name in enumerate(LANE_NAMES)
+        }
+        stats["states"] = {
+            "depth": len(self._states),
+            "replaced": self.states_replaced,
+            "dropped": self.states_dropped,
+        }
+        return stats
@@ -0,0 +1,175 @@
+"""
+基于asyncio.Protocol的传输层
+复用接收缓冲区，直接从memoryview解析32字节头和消息体，按批交付完整帧
+"""
+
+import asyncio
+import json
+import struct
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional
+
+from .compression import FLAG_ZLIB, decompress, unpack_header
+from .utils import LOGGER
+
+HEADER_LEN = 32
+MAX_FRAME_SIZE = 1024 * 1024
+
+_HEADER = struct.Struct("<I")
+
+# 积压未取走的帧超过该数量时暂停读取
+MAX_PENDING_FRAMES = 1000
+
+
+def _json_loads(data) -> Any:
+    """memoryview（未压缩帧）或bytes（解压后的帧）"""
+    return json.loads(bytes(data))
+
+
+class FrameParser:
+    """增量帧解析器
+
+    数据追加到同一个bytearray，每次feed解析出所有完整帧后一次性丢弃已消费部分。
+    """
+
+    def __init__(self, loads: Callable[[memoryview], Any] = _json_loads,
+                 max_size: int = MAX_FRAME_SIZE):
+        self.loads = loads
+        self.max_size = max_size
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> List[Any]:
+        buf = self._buf
+        buf += data
+        frames = []
+        pos = 0
+        end_of_data = len(buf)
+        with memoryview(buf) as view:
+            while end_of_data - pos >= HEADER_LEN:
+                size = _HEADER.unpack_from(view, pos)[0]
+                if size <= 0 or size > self.max_size:
+                    raise ValueError(f"invalid packet size: {size}")
+                end = pos + HEADER_LEN + size
+                if end > end_of_data:
+                    break
+                with view[pos + HEADER_LEN:end] as body:
+                    flags = view[pos + 4]
+                    if flags & FLAG_ZLIB:
+                        _, _, dict_id, _ = unpack_header(view, pos)
+                        frames.append(self.loads(decompress(body, dict_id, self.max_size)))
+                    else:
+                        frames.append(self.loads(body))
+                pos = end
+        if pos:
+            del buf[:pos]
+        return frames
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buf)
+
+
+class FrameProtocol(asyncio.Protocol):
+    """帧协议 - 同时提供与StreamWriter一致的写接口（write/writelines/drain/close）"""
+
+    def __init__(self, parser: Optional[FrameParser] = None):
+        self.parser = parser or FrameParser()
+        self.transport: Optional[asyncio.Transport] = None
+        self._frames: Deque[Any] = deque()
+        self._frames_ready = asyncio.Event()
+        self._exc: Optional[BaseException] = None
+        self._closed = asyncio.get_running_loop().create_future()
+        self._paused = False
+        self._drain_waiter: Optional[asyncio.Future] = None
+        self._reading_paused = False
+        self.bytes_received = 0
+
+    # asyncio.Protocol 回调
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.bytes_received += len(data)
+        try:
+            frames = self.parser.feed(data)
+        except Exception as e:
+            LOGGER.error("Frame parse failed: %s", e)
+            self._set_exception(e)
+            self.transport.close()
+            return
+        if frames:
+            self._frames.extend(frames)
+            self._frames_ready.set()
+            if len(self._frames) >= MAX_PENDING_FRAMES and not self._reading_paused:
+                self._reading_paused = True
+                self.transport.pause_reading()
+
+    def eof_received(self):
+        self._set_exception(ConnectionError("connection closed by server"))
+        return False
+
+    def connection_lost(self, exc):
+        self._set_exception(exc or ConnectionError("connection lost"))
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self._wake_drain(exc)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake_drain(None)
+
+    def _set_exception(self, exc: BaseException):
+        if self._exc is None:
+            self._exc = exc
+        self._frames_ready.set()
+
+    def _wake_drain(self, exc):
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            if exc is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(exc)
+
+    # 读接口
+    async def read_batch(self) -> List[Any]:
+        """等待并取走当前所有已解析的帧"""
+        while not self._frames:
+            if self._exc is not None:
+                raise self._exc
+            self._frames_ready.clear()
+            await self._frames_ready.wait()
+        frames = list(self._frames)
+        self._frames.clear()
+        if self._reading_paused and self.transport is not None:
+            self._reading_paused = False
+            self.transport.resume_reading()
+        return frames
+
+    # 写接口
+    def write(self, data):
+        self.transport.write(data)
+
+    def writelines(self, buffers):
+        self.transport.writelines(buffers)
+
+    async def drain(self):
+        if self.transport is None or self.transport.is_closing():
+            raise ConnectionError("transport closed")
+        if not self._paused:
+            return
+        self._drain_waiter = asyncio.get_running_loop().create_future()
+        await self._drain_waiter
+
+    def get_extra_info(self, name, default=None):
+        return self.transport.get_extra_info(name, default)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def wait_closed(self):
+        await self._closed
@@ -0,0 +1,130 @@
+"""
+线上流量录制
+把收发的每一帧（解压后的消息体）连同时间戳追加写入文件，用于离线回放和性能复现，默认关闭
+
+文件布局（小端）：
+    文件头  8字节魔数 b"HLREC01\\n"
+    记录    8字节墙钟时间(double) + 1字节方向(0收/1发) + 4字节长度 + 消息体
+文件只追加，多次运行的记录首尾相接，按时间戳即可区分。
+本模块不依赖HA，回放工具按文件路径直接加载。
+"""
+
+import os
+import struct
+import time
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+MAGIC = b"HLREC01\n"
+DIRECTION_IN = 0
+DIRECTION_OUT = 1
+
+_RECORD = struct.Struct("<dBI")
+
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 1.0  # 缓冲不满时最多积压的秒数
+MAX_FILE_SIZE = 200 * 1024 * 1024  # 超过后停止录制
+
+REDACTED_LOGIN = b'"Username":"***","Password":"***"'
+
+
+class FrameRecorder:
+    """帧录制器 - 事件循环中只追加到内存缓冲，文件写入交给执行器串行完成"""
+
+    def __init__(self, path: str, run_in_executor: Callable[..., Any],
+                 max_file_size: int = MAX_FILE_SIZE):
+        self.path = path
+        self._run_in_executor = run_in_executor
+        self.max_file_size = max_file_size
+        self._buffer = bytearray()
+        self._writing = None
+        self._written = 0
+        self._flushed_at = time.monotonic()
+        self._secret = b""
+        self._redacted = REDACTED_LOGIN
+        self.records = 0
+        self.stopped = False
+
+    def set_login_fragment(self, fragment: bytes, redacted: bytes = REDACTED_LOGIN):
+        """登录片段会被拼入每条上行消息，录制时替换为脱敏内容"""
+        self._secret = fragment
+        self._redacted = redacted
+
+    def record(self, direction: int, body: bytes):
+        if self.stopped:
+            return
+        if direction == DIRECTION_OUT and self._secret:
+            body = body.replace(self._secret, self._redacted, 1)
+        self._buffer += _RECORD.pack(time.time(), direction, len(body))
+        self._buffer += body
+        self.records += 1
+        if len(self._buffer) >= FLUSH_BYTES or time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """把缓冲交给执行器写出；上一次写入未完成时继续累积"""
+        if not self._buffer or self._writing is not None:
+            return
+        data, self._buffer = bytes(self._buffer), bytearray()
+        self._flushed_at = time.monotonic()
+        self._writing = self._run_in_executor(self._write, data)
+        self._writing.add_done_callback(self._on_written)
+
+    def _on_written(self, future):
+        self._writing = None
+        if future.cancelled() or future.exception() is not None:
+            self.stopped = True
+            self._buffer.clear()
+            return
+        self.flush()
+
+    async def close(self):
+        """写出剩余缓冲"""
+        while self._writing is not None or self._buffer:
+            if self._writing is None:
+                self.flush()
+            writing = self._writing
+            if writing is None:
+                break
+            try:
+                await writing
+            except Exception:
+                break
+        self.stopped = True
+
+    def _write(self, data: bytes):
+        with open(self.path, "ab") as f:
+            if f.tell() == 0:
+                f.write(MAGIC)
+            elif f.tell() + len(data) > self.max_file_size:
+                self.stopped = True
+                return
+            f.write(data)
+        self._written += len(data)
+
+    def get_stats(self):
+        return {
+            "path": self.path,
+            "records": self.records,
+            "written_bytes": self._written,
+            "stopped": self.stopped,
+        }
+
+
+def iter_records(path: str) -> Iterator[Tuple[float, int, bytes]]:
+    """读取录制文件，依次返回 (时间戳, 方向, 消息体)；末尾不完整的记录忽略"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"not a hasslife recording: {path}")
+        while True:
+            head = f.read(_RECORD.size)
+            if len(head) < _RECORD.size:
+                return
+            ts, direction, size = _RECORD.unpack(head)
+            body = f.read(size)
+            if len(body) < size:
+                return
+            yield ts, direction, body
+
+
+def default_path(config_dir: Optional[str]) -> str:
+    return os.path.join(config_dir or ".", "hasslife_traffic.rec")
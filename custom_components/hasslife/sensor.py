@@ -0,0 +1,64 @@
+"""Diagnostic sensors for HassLife client metrics."""
+from datetime import timedelta
+from typing import Any, Callable
+
+from homeassistant.components.sensor import SensorEntity, SensorStateClass
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from . import DOMAIN
+
+SCAN_INTERVAL = timedelta(seconds=30)
+
+# key, 名称, 单位, state_class, 取值函数
+SENSORS = (
+    ("queue_depth", "Outbound queue depth", None, SensorStateClass.MEASUREMENT,
+     lambda c: c.queue_depth),
+    ("frames_sent", "Frames sent", None, SensorStateClass.TOTAL_INCREASING,
+     lambda c: c.metrics.counters["frames_sent"]),
+    ("bytes_sent", "Bytes sent", UnitOfInformation.BYTES, SensorStateClass.TOTAL_INCREASING,
+     lambda c: c.metrics.counters["bytes_sent"]),
+    ("frames_received", "Frames received", None, SensorStateClass.TOTAL_INCREASING,
+     lambda c: c.metrics.counters["frames_received"]),
+    ("bytes_received", "Bytes received", UnitOfInformation.BYTES, SensorStateClass.TOTAL_INCREASING,
+     lambda c: c.metrics.counters["bytes_received"]),
+    ("reconnects", "Reconnects", None, SensorStateClass.TOTAL_INCREASING,
+     lambda c: c.metrics.counters["reconnects"]),
+    ("heartbeat_rtt", "Heartbeat RTT", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda c: round(c.heartbeat_rtt * 1000, 1) if c.heartbeat_rtt is not None else None),
+    ("control_latency", "Control latency p90", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT,
+     lambda c: round(c.metrics.histograms["control_latency"].percentile(0.9) * 1000, 1)),
+)
+
+
+async def async_setup_entry(
+    hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback
+) -> None:
+    """Set up HassLife diagnostic sensors (disabled by default)."""
+    client = hass.data[DOMAIN][entry.entry_id]["client"]
+    async_add_entities(
+        HassLifeMetricSensor(client, entry, *description) for description in SENSORS
+    )
+
+
+class HassLifeMetricSensor(SensorEntity):
+    """A single client metric."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_should_poll = True
+
+    def __init__(self, client, entry: ConfigEntry, key: str, name: str, unit,
+                 state_class, value_fn: Callable[[Any], Any]):
+        self._client = client
+        self._value_fn = value_fn
+        self._attr_unique_id = f"{entry.entry_id}_{key}"
+        self._attr_name = f"HassLife {name}"
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+
+    @property
+    def native_value(self):
+        return self._value_fn(self._client)
@@ -0,0 +1,58 @@
+"""
+已编码状态缓存
+HA的State对象不可变，状态变化时会换成新对象，所以按entity_id缓存完整状态的JSON，
+命中条件是缓存的State与当前State是同一个对象；批量查询和重连后的全量上报不再重复编码
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Tuple
+
+from homeassistant.core import State
+
+from . import codec
+
+STATE_CACHE_SIZE = 2048
+
+
+class EncodedStateCache:
+    """LRU缓存 entity_id -> (State, 完整状态JSON)"""
+
+    def __init__(self, max_size: int = STATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[State, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, state: State) -> str:
+        entity_id = state.entity_id
+        entries = self._entries
+        cached = entries.get(entity_id)
+        if cached is not None and cached[0] is state:
+            entries.move_to_end(entity_id)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        encoded = codec.dumps_str({
+            "attributes": state.attributes,
+            "entity_id": entity_id,
+            "state": state.state,
+        })
+        entries[entity_id] = (state, encoded)
+        entries.move_to_end(entity_id)
+        if len(entries) > self.max_size:
+            entries.popitem(last=False)
+        return encoded
+
+    @staticmethod
+    def join(encoded: Iterable[str]) -> str:
+        """把多个已编码状态拼成JSON数组"""
+        return "[" + ",".join(encoded) + "]"
+
+    def forget(self, entity_id: str):
+        self._entries.pop(entity_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
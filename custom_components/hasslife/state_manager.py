@@ -4,63 +4,155 @@
 """
 
 import asyncio
-import json
 import time
-from typing import Dict, List, Optional, Set
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set
 from homeassistant.core import HomeAssistant, State, Event
-from homeassistant.helpers.json import JSONEncoder
 
+from .catalog import DeviceCatalog
+from .const import FULL_SNAPSHOT_INTERVAL
+from .filters import SignificanceFilter
+from .hasslife_config import HASSLIFE_CONFIGS
 from .utils import LOGGER
 
 
+class AttributeDeltaTracker:
+    """属性增量编码 - 记录本连接上每个实体最后上报的属性，只发送变化和删除的键"""
+
+    def __init__(self, snapshot_interval: float = FULL_SNAPSHOT_INTERVAL):
+        self.snapshot_interval = snapshot_interval
+        # entity_id -> 最后上报的属性（HA的attributes本身只读，直接引用即可）
+        self._reported: Dict[str, Mapping[str, Any]] = {}
+        self._last_snapshot: Dict[str, float] = {}
+
+    def reset(self):
+        """连接重建后清空记录，下次上报全部为完整快照"""
+        self._reported.clear()
+        self._last_snapshot.clear()
+
+    def encode(self, state: State) -> Dict[str, Any]:
+        """生成上报内容，并把本次属性记为已上报"""
+        entity_id = state.entity_id
+        attributes = state.attributes
+        payload = {
+            "attributes": attributes,
+            "entity_id": entity_id,
+            "state": state.state,
+        }
+        now = time.monotonic()
+        last = self._reported.get(entity_id)
+        self._reported[entity_id] = attributes
+
+        if last is None or now - self._last_snapshot.get(entity_id, 0) >= self.snapshot_interval:
+            self._last_snapshot[entity_id] = now
+            return payload
+
+        payload["attributes"] = {
+            key: value for key, value in attributes.items()
+            if key not in last or last[key] != value
+        }
+        payload["delta"] = True
+        removed = [key for key in last if key not in attributes]
+        if removed:
+            payload["removed"] = removed
+        return payload
+
+
 class StateSyncManager:
     """状态同步管理器 - 优化状态上报"""
     
-    def __init__(self, hass: HomeAssistant, client, white_domains: List[str]):
+    def __init__(self, hass: HomeAssistant, client, white_domains: List[str],
+                 clock: Callable[[], float] = time.monotonic):
         self.hass = hass
         self.client = client
         self.white_domains = set(white_domains)
-        # 状态缓存
-        self._pending_sync_states = set()
+        self._clock = clock
 
         # 批量同步配置
-        self._batch_interval = 0.5  # 500ms批量处理
         self._batch_size = 50  # 每批最多50个设备
+        self._batch_slack = 0.05  # 50ms内到期的实体顺带并入同一批
         self._sync_task: Optional[asyncio.Task] = None
         
-        # 防抖机制
-        self._state_change_debounce = 0.1  # 100ms防抖
-        self._last_state_change = {}
+        # 尾沿合并防抖：连续变化合并为一次上报，最后一个状态最迟在_max_sync_delay内发出
+        self._state_change_debounce = 0.1  # 100ms静默后上报
+        self._max_sync_delay = 0.5  # 持续变化时最长延迟
+        self._deadlines: Dict[str, float] = {}  # entity_id -> 上报时间
+        self._burst_start: Dict[str, float] = {}  # entity_id -> 本轮变化开始时间
+        self._wakeup = asyncio.Event()
+
+        # 属性显著性过滤，可在配置中用significance覆盖默认规则
+        hassconfig = HASSLIFE_CONFIGS.get_config_object().get("hassconfig", {})
+        self._filter = SignificanceFilter(hassconfig.get("significance"), clock)
+
+        # SyncDevice分页使用的设备目录
+        self._catalog = DeviceCatalog(hass, white_domains)
         
     def start(self):
         """启动状态管理器"""
+        self._catalog.start()
         self._sync_task = asyncio.create_task(self._sync_worker())
         LOGGER.info("StateSyncManager started")
     
     def stop(self):
         """停止状态管理器"""
+        self._catalog.stop()
         if self._sync_task:
             self._sync_task.cancel()
         LOGGER.info("StateSyncManager stopped")
     
     async def _sync_worker(self):
-        """状态同步工作协程"""
+        """状态同步工作协程 - 按最近的到期时间唤醒，而不是固定轮询"""
         while True:
             try:
-                await asyncio.sleep(self._batch_interval)
-                
-                if self._pending_sync_states:
-                    states_to_sync = list(self._pending_sync_states)
-                    self._pending_sync_states.clear()
-                    
-                    # 批量同步
-                    await self._batch_sync_states(states_to_sync)
+                self._wakeup.clear()
+                due = self.pop_due(self._clock())
+                if due:
+                    await self._batch_sync_states(due)
+                    continue
+
+                timeout = self.next_timeout(self._clock())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
                     
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 LOGGER.error("State sync worker error: %s", e)
                 await asyncio.sleep(1)
+
+    def schedule(self, entity_id: str, now: float, at: Optional[float] = None):
+        """登记一次变化：推迟到静默_state_change_debounce后，但不晚于本轮开始+_max_sync_delay
+
+        指定at时在该时间上报（限频属性的尾随上报），已有更早的到期时间则保持不变
+        """
+        if at is not None:
+            current = self._deadlines.get(entity_id)
+            if current is None or at < current:
+                self._deadlines[entity_id] = at
+                self._burst_start.setdefault(entity_id, now)
+                self._wakeup.set()
+            return
+        start = self._burst_start.setdefault(entity_id, now)
+        self._deadlines[entity_id] = min(
+            now + self._state_change_debounce, start + self._max_sync_delay
+        )
+        self._wakeup.set()
+
+    def pop_due(self, now: float) -> List[str]:
+        """取出已到期（含即将到期）的实体"""
+        limit = now + self._batch_slack
+        due = [eid for eid, deadline in self._deadlines.items() if deadline <= limit]
+        for entity_id in due:
+            del self._deadlines[entity_id]
+            del self._burst_start[entity_id]
+        return due
+
+    def next_timeout(self, now: float) -> Optional[float]:
+        """距离最近到期的秒数，无待上报时返回None"""
+        if not self._deadlines:
+            return None
+        return max(0.0, min(self._deadlines.values()) - now)
     
     async def _batch_sync_states(self, entity_ids: List[str]):
         """批量同步状态"""
@@ -79,129 +171,69 @@ class StateSyncManager:
             state = self.hass.states.get(entity_id)
             if state:
                 states.append(state)
+                self._filter.mark_reported(entity_id, state.attributes)
         
-        for state in states:
-            await self.client.sync_device_state_async(state)
+        # 整批交给客户端，由客户端决定合并为一帧或逐个上报
+        await self.client.sync_device_states_async(states)
     
     def on_state_changed(self, entity_id: str, old_state: State, new_state: State):
         """处理状态变化 - 只上报服务器指定的实体"""
         if not new_state:
+            self._filter.forget(entity_id)
             return
             
-        LOGGER.debug("状态变化检测: %s 从 %s 到 %s", entity_id, 
-                    old_state.state if old_state else "None", new_state.state)
-            
-        # 检查是否在服务器指定的实体列表中
-        if not hasattr(self.client, 'entity_ids') or not self.client.entity_ids:
-            LOGGER.debug("服务器未指定实体列表，跳过: %s", entity_id)
-            return
-            
+        # 检查是否在服务器指定的实体集合中（高频路径，先过滤再做其他事）
         if entity_id not in self.client.entity_ids:
-            LOGGER.debug("实体不在服务器指定列表中: %s", entity_id)
             return
+
+        LOGGER.debug("状态变化检测: %s 从 %s 到 %s", entity_id, 
+                    old_state.state if old_state else "None", new_state.state)
             
         # 检查是否需要同步
         if not self._should_sync_state(entity_id, old_state, new_state):
             LOGGER.debug("状态未变化，跳过同步: %s", entity_id)
+            trailing_at = self._filter.pop_trailing(entity_id)
+            if trailing_at is not None:
+                self.schedule(entity_id, self._clock(), at=trailing_at)
             return
             
-        # 防抖处理
-        now = time.time()
-        last_change = self._last_state_change.get(entity_id, 0)
-        if now - last_change < self._state_change_debounce:
-            LOGGER.debug("防抖跳过: %s", entity_id)
-            return
-            
-        LOGGER.info("添加状态同步队列: %s", entity_id)
-        self._last_state_change[entity_id] = now
-        self._pending_sync_states.add(entity_id)
+        # 尾沿合并，最后一个状态一定会上报
+        LOGGER.debug("添加状态同步队列: %s", entity_id)
+        self.schedule(entity_id, self._clock())
     
     def _should_sync_state(self, entity_id: str, old_state: State, new_state: State) -> bool:
-        """判断是否需要同步状态 - 现在上报所有属性变化"""
-        # 首次出现的状态
-        if not old_state:
-            return True
-            
-        # 状态值变化
-        if old_state.state != new_state.state:
-            return True
-            
-        # 所有属性变化都上报
-        old_attrs = old_state.attributes or {}
-        new_attrs = new_state.attributes or {}
-        
-        # 检查所有属性，不再过滤重要属性
-        if old_attrs != new_attrs:
-            return True
-                
-        return False
+        """判断是否需要同步状态 - 状态值变化总是上报，属性变化经显著性过滤"""
+        return self._filter.should_report(entity_id, old_state, new_state)
     
     async def sync_all_devices(self, page=1, page_size=30, search_keyword=None, request_id=''):
         """同步所有设备 - 支持分页、搜索、请求ID和实时发送"""
-        # 获取所有需要同步的设备
-        devicelist = self.hass.states.async_all()
-        all_devices = []
-        
-        # 第一步：过滤domain并收集所有设备
-        for sinfo in devicelist:
-            dinfo = sinfo.as_dict()
-            entity_id = dinfo['entity_id']
-            domain = entity_id.split(".")[0]
-            
-            if domain in self.white_domains:
-                # 只保留 entity_id 和 attributes.friendly_name,精简数据格式
-                friendly_name = dinfo.get('attributes', {}).get('friendly_name', "")
-                filtered_device = {
-                    'entity_id': entity_id,
-                    'attributes': {
-                        'friendly_name': friendly_name
-                    }
-                }
-                all_devices.append(filtered_device)
-        # 按entity_id排序
-        all_devices.sort(key=lambda x: x['entity_id'])
-        
-        # 第二步：搜索过滤（如果有搜索条件）
-        if search_keyword:
-            keyword = search_keyword.lower()
-            usefull_entity = [
-                device for device in all_devices
-                if keyword in device['entity_id'].lower() or keyword in device['attributes']['friendly_name'].lower()
-            ]
-            total_count = len(usefull_entity)
-        else:
-            # 无搜索条件，使用所有设备
-            usefull_entity = all_devices
-            total_count = len(all_devices)
-        # 计算分页
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        paginated_devices = usefull_entity[start_idx:end_idx]
-        send_list = paginated_devices
-        has_more = end_idx < total_count
-        jlist = json.dumps(send_list, sort_keys=True, cls=JSONEncoder, default=str)
+        # 从增量维护的目录索引中取页，页面JSON有缓存
+        jlist, total_count, has_more = self._catalog.page(page, page_size, search_keyword)
         body = {
             'Type': 'SyncDevice',
             'Payload': {
-                'Username': self.client.get_login_info()['Username'],
-                'Password': self.client.get_login_info()['Password'],
-                'Version': self.client.get_login_info()['Version'],
+                # 登录信息由客户端编码时拼入
                 'List': jlist,
                 'TotalCount': total_count,
                 'Page': page,
                 'PageSize': page_size if page_size is not None else total_count,
-                'HasMore': has_more
+                'HasMore': has_more,
+                'CatalogFingerprint': self._catalog.fingerprint(),
             }
         }
         # 包含请求ID在响应中（如果有）
         if request_id:
             body['RequestID'] = request_id
-        # 实时发送，不经过队列
+        # 走应答通道，优先于积压的状态上报
         LOGGER.info("sync_device_async send %s", request_id)
-        await self.client._send_now(body)
+        await self.client.send_message_async(body)
     
-    def get_sync_stats(self) -> Dict[str, int]:
+    def catalog_fingerprint(self) -> str:
+        return self._catalog.fingerprint()
+
+    def get_sync_stats(self) -> Dict[str, Any]:
         """获取同步统计信息"""
         return {
-            "pending_sync_count": len(self._pending_sync_states),
+            "pending_sync_count": len(self._deadlines),
+            "suppressed": self._filter.get_stats(),
         }
\ No newline at end of file
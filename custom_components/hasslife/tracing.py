@@ -0,0 +1,128 @@
+"""
+控制链路延迟追踪
+记录DeviceControl从收到帧到对应SyncState发出的各阶段时间，默认关闭
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+from .metrics import Histogram
+
+# 阶段按顺序排列
+STAGES = ("received", "dispatched", "completed", "state_changed", "flushed")
+
+SLOW_THRESHOLD = 1.0  # 总耗时超过1秒记入慢追踪
+RING_SIZE = 50
+TRACE_TIMEOUT = 30  # 超时未等到状态上报的追踪直接结束
+
+
+class ControlTrace:
+    """单次控制命令的追踪记录"""
+
+    __slots__ = ("request_id", "entity_ids", "times")
+
+    def __init__(self, request_id: str, entity_ids: Iterable[str], received: float):
+        self.request_id = request_id
+        self.entity_ids = list(entity_ids)
+        self.times: Dict[str, float] = {"received": received}
+
+    def as_dict(self) -> Dict[str, Any]:
+        start = self.times["received"]
+        return {
+            "request_id": self.request_id,
+            "entity_ids": self.entity_ids,
+            "stages_ms": {
+                stage: round((self.times[stage] - start) * 1000, 1)
+                for stage in STAGES if stage in self.times
+            },
+        }
+
+
+class ControlTracer:
+    """控制链路追踪器 - 各阶段耗时分位数 + 慢追踪环形缓冲"""
+
+    def __init__(self, enabled: bool = False, slow_threshold: float = SLOW_THRESHOLD,
+                 ring_size: int = RING_SIZE, clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self._clock = clock
+        # entity_id -> 等待状态变化/上报的追踪，携带其状态的帧写出后结束
+        self._waiting: Dict[str, ControlTrace] = {}
+        # 相邻阶段之间的耗时，以及总耗时
+        self.stage_latency: Dict[str, Histogram] = {
+            f"{a}->{b}": Histogram() for a, b in zip(STAGES, STAGES[1:])
+        }
+        self.stage_latency["total"] = Histogram()
+        self.slow_traces: Deque[Dict[str, Any]] = deque(maxlen=ring_size)
+        self.completed = 0
+        self.expired = 0
+
+    def start(self, request_id: str, entity_ids: Iterable[str]) -> Optional[ControlTrace]:
+        if not self.enabled:
+            return None
+        now = self._clock()
+        self._expire(now)
+        trace = ControlTrace(request_id, entity_ids, now)
+        for entity_id in trace.entity_ids:
+            self._waiting[entity_id] = trace
+        return trace
+
+    def mark(self, trace: Optional[ControlTrace], stage: str):
+        if trace is not None:
+            trace.times.setdefault(stage, self._clock())
+
+    def on_state_changed(self, entity_id: str):
+        trace = self._waiting.get(entity_id)
+        if trace is not None:
+            self.mark(trace, "state_changed")
+
+    def on_flushed(self, entity_ids: Iterable[str]):
+        """这些实体的状态已随帧写出（OutboundScheduler.ack的结果）；帧丢失时追踪继续等待重发或超时"""
+        waiting = self._waiting
+        now = None
+        for entity_id in entity_ids:
+            trace = waiting.get(entity_id)
+            if trace is not None and "state_changed" in trace.times:
+                if now is None:
+                    now = self._clock()
+                trace.times["flushed"] = now
+                self._release(trace)
+                self._finish(trace)
+
+    def _release(self, trace: ControlTrace):
+        for entity_id in trace.entity_ids:
+            if self._waiting.get(entity_id) is trace:
+                del self._waiting[entity_id]
+
+    def _finish(self, trace: ControlTrace):
+        times = trace.times
+        for a, b in zip(STAGES, STAGES[1:]):
+            if a in times and b in times:
+                # 非阻塞服务调用时状态变化可能早于调用完成，按0计
+                self.stage_latency[f"{a}->{b}"].observe(max(0.0, times[b] - times[a]))
+        total = times.get("flushed", times.get("completed", times["received"])) - times["received"]
+        self.stage_latency["total"].observe(total)
+        self.completed += 1
+        if total >= self.slow_threshold:
+            self.slow_traces.append(trace.as_dict())
+
+    def _expire(self, now: float):
+        expired = {
+            trace for trace in self._waiting.values()
+            if now - trace.times["received"] > TRACE_TIMEOUT
+        }
+        for trace in expired:
+            self._release(trace)
+            self.expired += 1
+            self.slow_traces.append(trace.as_dict())
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "completed": self.completed,
+            "expired": self.expired,
+            "in_progress": len(set(self._waiting.values())),
+            "stage_latency": {name: h.as_dict() for name, h in self.stage_latency.items()},
+            "slow_traces": list(self.slow_traces),
+        }
@@ -1,9 +1,6 @@
 """Utils for HassLife."""
 import logging
 import random
-import socket
-import uuid
-import yaml
 import json
 
 from .const import TCP_PACK_HEADER_LEN
@@ -21,6 +18,7 @@ def get_mac_addr():
 
 def dns_open(host):
     """Get ip from hostname."""
+    import socket
     try:
         ip_host = socket.gethostbyname(host)
     except socket.error:
@@ -49,6 +47,7 @@ def get_rand_char(length):
 
 def get_local_seed(config_file):
     """Read seed from local file."""
+    import yaml
     local_seed = ""
     try:
         with open(config_file, 'r') as file_obj:
@@ -63,6 +62,7 @@ def get_local_seed(config_file):
 
 def save_local_seed(config_file, local_seed):
     """Save seed to local file."""
+    import yaml
     config_data = None
     try:
         with open(config_file, 'r') as rfile:
@@ -83,6 +83,7 @@ def save_local_seed(config_file, local_seed):
 
 def load_uuid(hass, filename='.uuid'):
     """Load UUID from a file or return None."""
+    import uuid
     try:
         with open(hass.config.path(filename)) as fptr:
             jsonf = json.loads(fptr.read())
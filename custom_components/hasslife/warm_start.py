@@ -0,0 +1,104 @@
+"""
+热启动持久化
+在HA的.storage中保存订阅实体、目录指纹和每个实体最后上报内容的哈希，
+重启后无需等待UpdateEntitys即可上报，Auth后只补发重启期间变化过的实体
+"""
+
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from homeassistant.core import HomeAssistant, State
+from homeassistant.helpers.storage import Store
+
+from . import codec
+from .utils import LOGGER
+
+STORAGE_KEY = "hasslife.warm_start"
+STORAGE_VERSION = 1
+SAVE_DELAY = 10
+
+
+def state_hash(state: State) -> int:
+    """上报内容的稳定哈希（跨进程一致，不能用内置hash）"""
+    return zlib.crc32(codec.dumps([state.state, state.attributes], sort_keys=True))
+
+
+class WarmStartStore:
+    """热启动数据 - 上报时只记录State引用，哈希推迟到防抖保存时统一计算"""
+
+    def __init__(self, hass: HomeAssistant):
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self.entity_ids: List[str] = []
+        self.catalog_fingerprint = ""
+        # entity_id -> 已保存的上报哈希
+        self._hashes: Dict[str, int] = {}
+        # entity_id -> 上次保存后最后上报的State
+        self._reported: Dict[str, State] = {}
+        self._save_pending = False
+
+    async def async_load(self):
+        try:
+            data = await self._store.async_load() or {}
+        except Exception as e:
+            LOGGER.warning("Load warm start data failed: %s", e)
+            data = {}
+        self.entity_ids = list(data.get("entity_ids") or [])
+        self.catalog_fingerprint = data.get("catalog_fingerprint") or ""
+        self._hashes = dict(data.get("state_hashes") or {})
+        LOGGER.debug("Warm start: %d entities, %d state hashes",
+                     len(self.entity_ids), len(self._hashes))
+
+    def set_entity_ids(self, entity_ids: Iterable[str]):
+        wanted = sorted(entity_ids)
+        if wanted == self.entity_ids:
+            return
+        self.entity_ids = wanted
+        keep = set(wanted)
+        self._hashes = {e: h for e, h in self._hashes.items() if e in keep}
+        self._reported = {e: s for e, s in self._reported.items() if e in keep}
+        self._schedule_save()
+
+    def set_catalog_fingerprint(self, fingerprint: str):
+        if fingerprint != self.catalog_fingerprint:
+            self.catalog_fingerprint = fingerprint
+            self._schedule_save()
+
+    def on_reported(self, states: Iterable[State]):
+        reported = self._reported
+        for state in states:
+            reported[state.entity_id] = state
+        self._schedule_save()
+
+    def changed_states(self, states: Iterable[State]) -> List[State]:
+        """与上次保存的上报内容不同（或从未上报过）的状态"""
+        hashes = self._hashes
+        return [s for s in states if hashes.get(s.entity_id) != state_hash(s)]
+
+    def _schedule_save(self):
+        # 已排队时不重新调用async_delay_save，否则持续上报会不断推迟保存
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _data_to_save(self) -> Dict[str, Any]:
+        self._save_pending = False
+        for entity_id, state in self._reported.items():
+            self._hashes[entity_id] = state_hash(state)
+        self._reported.clear()
+        return {
+            "entity_ids": self.entity_ids,
+            "catalog_fingerprint": self.catalog_fingerprint,
+            "state_hashes": self._hashes,
+        }
+
+    async def async_flush(self):
+        """卸载时立即保存未落盘的变化"""
+        if self._save_pending:
+            await self._store.async_save(self._data_to_save())
+
+    def get_stats(self) -> Dict[str, Optional[Any]]:
+        return {
+            "entity_ids": len(self.entity_ids),
+            "state_hashes": len(self._hashes),
+            "catalog_fingerprint": self.catalog_fingerprint,
+        }
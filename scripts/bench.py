@@ -0,0 +1,632 @@
+"""
+OptimizedTcpClient 压测工具
+在进程内启动模拟服务器和一个不加载任何集成的 HomeAssistant 核心（bus/states/services），
+制造状态变化风暴并统计吞吐、延迟分位数和内存。需要安装 homeassistant。
+
+    python scripts/bench.py --scenario storm --entities 2000 --rate 5000 --duration 10
+    python scripts/bench.py --scenario all
+    python scripts/bench.py --scenario codec --rounds 20
+    python scripts/bench.py --scenario subscription --entities 10000 --rate 50000
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(ROOT, "custom_components"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from homeassistant.core import HomeAssistant, State, callback  # noqa: E402
+from homeassistant.helpers.json import JSONEncoder  # noqa: E402
+
+from hasslife import codec, compression  # noqa: E402
+from hasslife.client_optimized import OptimizedTcpClient  # noqa: E402
+from hasslife.hasslife_config import HASSLIFE_CONFIGS  # noqa: E402
+from hasslife.protocol import FrameParser  # noqa: E402
+from hasslife.state_manager import StateSyncManager  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+SCENARIOS = ("startup", "storm", "slow_consumer", "lossy", "reconnect_storm", "control", "failover",
+             "codec", "unsubscribed", "parse", "control_merge",
+             "subscription")
+
+# 属性较多的典型状态，用于codec场景
+CODEC_SAMPLES = {
+    "climate": ("heat", {
+        "hvac_modes": ["off", "heat", "cool", "auto", "dry", "fan_only"],
+        "min_temp": 7, "max_temp": 35, "target_temp_step": 0.5,
+        "fan_modes": ["auto", "low", "medium", "high"],
+        "preset_modes": ["none", "eco", "away", "boost", "comfort", "home", "sleep"],
+        "swing_modes": ["off", "vertical", "horizontal", "both"],
+        "current_temperature": 21.3, "temperature": 22.5, "current_humidity": 48,
+        "fan_mode": "auto", "hvac_action": "heating", "preset_mode": "comfort", "swing_mode": "off",
+        "friendly_name": "客厅空调", "supported_features": 441,
+    }),
+    "media_player": ("playing", {
+        "volume_level": 0.35, "is_volume_muted": False,
+        "media_content_id": "spotify:track:4uLU6hMCjMI75M1A2tKUQC",
+        "media_content_type": "music", "media_duration": 212, "media_position": 87,
+        "media_position_updated_at": datetime.datetime(2024, 1, 1, 12, 0, 0, 123456,
+                                                       tzinfo=datetime.timezone.utc),
+        "media_title": "Never Gonna Give You Up", "media_artist": "Rick Astley",
+        "media_album_name": "Whenever You Need Somebody",
+        "source_list": ["Spotify", "AirPlay", "Line In", "TV", "Bluetooth"],
+        "sound_mode_list": {"music", "movie", "night"},
+        "group_members": ["media_player.living_room", "media_player.kitchen"],
+        "source": "Spotify", "shuffle": False, "repeat": "off",
+        "entity_picture": "/api/media_player_proxy/media_player.living_room?token=abc&cache=123",
+        "friendly_name": "客厅音箱", "supported_features": 4127295,
+    }),
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+    return {"count": len(values), "p50_ms": pick(0.5), "p90_ms": pick(0.9),
+            "p99_ms": pick(0.99), "max_ms": round(values[-1] * 1000, 2)}
+
+
+async def create_hass() -> HomeAssistant:
+    """只有核心的HomeAssistant实例，用作被测客户端的hass"""
+    config_dir = tempfile.mkdtemp(prefix="hasslife-bench-")
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:  # 旧版本HA构造函数不带参数
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    return hass
+
+
+class Bench:
+    """一次压测运行：服务器 + hass + 客户端"""
+
+    def __init__(self, args, read_delay: float = 0.0, drop_rate: float = 0.0):
+        self.args = args
+        self.entity_ids = [f"light.bench_{i}" for i in range(args.entities)]
+        self.server = StubServer(self.entity_ids, read_delay=read_delay, drop_rate=drop_rate)
+        self.server.on_state = self._on_state
+        self.hass: Optional[HomeAssistant] = None
+        self.client: Optional[OptimizedTcpClient] = None
+        self._sent_at: Dict[tuple, float] = {}
+        self.latencies: List[float] = []
+        self._seq = 0
+
+    def _on_state(self, entity_id: str, payload: Dict[str, Any], now: float):
+        seq = (payload.get("attributes") or {}).get("seq")
+        sent = self._sent_at.pop((entity_id, seq), None)
+        if sent is not None:
+            self.latencies.append(now - sent)
+
+    def set_state(self, entity_id: str, state: str = "on", **attrs):
+        self._seq += 1
+        attributes = {"friendly_name": entity_id, "brightness": self._seq % 255,
+                      "seq": self._seq, **attrs}
+        self._sent_at[(entity_id, self._seq)] = time.monotonic()
+        self.hass.states.async_set(entity_id, state, attributes)
+
+    async def __aenter__(self):
+        port = await self.server.start()
+        self.hass = await create_hass()
+        for entity_id in self.entity_ids:
+            self.hass.states.async_set(entity_id, "off", {"friendly_name": entity_id})
+        HASSLIFE_CONFIGS.load("release")
+        HASSLIFE_CONFIGS.get_config_object()["hassconfig"] = {
+            "username": "bench", "password": "bench", "connect_jitter": self.args.jitter,
+        }
+        self.client = OptimizedTcpClient("127.0.0.1", port, self.hass, self.args.transport)
+        started = time.monotonic()
+        await self.client.start()
+        await asyncio.wait_for(self.server.authed.wait(), 30)
+        self.time_to_auth = time.monotonic() - started
+        # 等待UpdateEntitys生效
+        while len(self.client.entity_ids) < len(self.entity_ids):
+            await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.client.stop()
+        await self.server.close()
+        await self.hass.async_stop(force=True)
+
+    async def storm(self, rate: int, duration: float, entity_ids: Optional[List[str]] = None):
+        """以rate次/秒随机修改实体状态（默认为服务器订阅的实体），持续duration秒"""
+        entity_ids = entity_ids or self.entity_ids
+        tick = 0.01
+        per_tick = max(1, int(rate * tick))
+        deadline = time.monotonic() + duration
+        changes = 0
+        while time.monotonic() < deadline:
+            for entity_id in random.sample(entity_ids, min(per_tick, len(entity_ids))):
+                self.set_state(entity_id)
+                changes += 1
+            await asyncio.sleep(tick)
+        return changes
+
+    async def wait_online(self, timeout: float = 60):
+        deadline = time.monotonic() + timeout
+        while not self.client._online and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def settle(self, timeout: float = 10):
+        """等待客户端把积压全部发出"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            client = self.client
+            if not client._state_manager.get_sync_stats()["pending_sync_count"] \
+                    and not client.queue_depth and not client._dirty_entities:
+                break
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(0.5)
+
+    def stale_entities(self) -> int:
+        """服务器视图与hass当前状态不一致的实体数"""
+        stale = 0
+        for entity_id in self.entity_ids:
+            state = self.hass.states.get(entity_id)
+            seen = self.server.latest.get(entity_id)
+            if seen is None:
+                stale += state.attributes.get("seq") is not None
+            elif seen["attributes"].get("seq") != state.attributes.get("seq"):
+                stale += 1
+        return stale
+
+    def report(self, name: str, changes: int, elapsed: float, **extra) -> Dict[str, Any]:
+        stats = self.server.stats
+        diag = self.client.get_diagnostics()
+        return {
+            "scenario": name,
+            "transport": self.args.transport,
+            "entities": len(self.entity_ids),
+            "time_to_auth_s": round(self.time_to_auth, 3),
+            "changes": changes,
+            "elapsed_s": round(elapsed, 2),
+            "frames_per_s": round(stats["frames_in"] / elapsed, 1),
+            "bytes_per_s": round(stats["bytes_in"] / elapsed, 1),
+            "states_received": stats["states_in"],
+            "delta_states": stats["delta_states_in"],
+            "raw_bytes": stats["raw_bytes_in"],
+            "wire_bytes": stats["bytes_in"],
+            "connections": stats["connections"],
+            "report_latency": percentiles(self.latencies),
+            "stale_entities": self.stale_entities(),
+            "client": {
+                "send": diag["send"],
+                "outbound": diag["outbound"],
+                "suppressed": diag["sync"].get("suppressed"),
+                "reconnects": diag["metrics"]["counters"]["reconnects"],
+            },
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            **extra,
+        }
+
+
+async def run_storm(args, name="storm", **server_opts) -> Dict[str, Any]:
+    async with Bench(args, **server_opts) as bench:
+        started = time.monotonic()
+        changes = await bench.storm(args.rate, args.duration)
+        await bench.settle()
+        return bench.report(name, changes, time.monotonic() - started)
+
+
+async def run_reconnect_storm(args) -> Dict[str, Any]:
+    async with Bench(args) as bench:
+        started = time.monotonic()
+        storm = asyncio.create_task(bench.storm(args.rate, args.duration))
+        kills = 0
+        while not storm.done():
+            await asyncio.sleep(args.kill_interval)
+            bench.server.kill_all()
+            kills += 1
+        changes = await storm
+        # 等客户端重新上线并补发断线期间的脏实体
+        await bench.wait_online()
+        await bench.settle()
+        return bench.report("reconnect_storm", changes, time.monotonic() - started, kills=kills)
+
+
+async def run_control(args) -> Dict[str, Any]:
+    """服务器下发args.rows行的DeviceControl，测量到全部状态回报的耗时"""
+    async with Bench(args) as bench:
+        hass = bench.hass
+
+        async def handle(call):
+            targets = call.data["entity_id"]
+            for entity_id in [targets] if isinstance(targets, str) else targets:
+                bench.set_state(entity_id, "on" if call.service == "turn_on" else "off")
+
+        hass.services.async_register("light", "turn_on", handle)
+        hass.services.async_register("light", "turn_off", handle)
+
+        rows = [{"domain": "light", "service": "turn_on", "data": {"entity_id": e}}
+                for e in bench.entity_ids[:args.rows]]
+        latencies = []
+        started = time.monotonic()
+        for round_no in range(args.rounds):
+            target = {e for e in bench.entity_ids[:args.rows]}
+            seen = set()
+            done = asyncio.Event()
+
+            def on_state(entity_id, payload, now, seen=seen, target=target, done=done):
+                bench._on_state(entity_id, payload, now)
+                seen.add(entity_id)
+                if seen >= target:
+                    done.set()
+
+            bench.server.on_state = on_state
+            sent = time.monotonic()
+            await bench.server.send_control(rows, f"bench-{round_no}")
+            await asyncio.wait_for(done.wait(), 30)
+            latencies.append(time.monotonic() - sent)
+            for row in rows:
+                row["service"] = "turn_off" if row["service"] == "turn_on" else "turn_on"
+        return bench.report("control", args.rows * args.rounds, time.monotonic() - started,
+                            command_latency=percentiles(latencies),
+                            control_results=len(bench.server.control_results))
+
+
+async def run_unsubscribed(args) -> Dict[str, Any]:
+    """只有未订阅的实体在变化：统计客户端状态回调的调用次数，按实体订阅时应为0"""
+    calls = 0
+    original = OptimizedTcpClient._async_on_state_changed
+
+    @callback
+    def counting(self, event):
+        nonlocal calls
+        calls += 1
+        return original(self, event)
+
+    # 监听在UpdateEntitys时注册，需要在客户端启动前替换
+    OptimizedTcpClient._async_on_state_changed = counting
+    try:
+        async with Bench(args) as bench:
+            noise = [f"light.noise_{i}" for i in range(args.entities)]
+            for entity_id in noise:
+                bench.hass.states.async_set(entity_id, "off", {"friendly_name": entity_id})
+            await asyncio.sleep(0.1)
+            calls = 0
+            started = time.monotonic()
+            changes = await bench.storm(args.rate, args.duration, noise)
+            await bench.settle()
+            return bench.report("unsubscribed", changes, time.monotonic() - started,
+                                subscribed=len(bench.client.entity_ids),
+                                state_callbacks=calls)
+    finally:
+        OptimizedTcpClient._async_on_state_changed = original
+
+
+def _inbound_stream(frames: int) -> bytes:
+    """模拟服务器下行：DeviceControl/QueryStates等大小不一的帧，超过阈值的按zlib压缩"""
+    rng = random.Random(0)
+    parts = []
+    for seq in range(frames):
+        rows = [{"domain": "light", "service": "turn_on",
+                 "data": {"entity_id": f"light.bench_{rng.randrange(1000)}", "brightness": seq % 255}}
+                for _ in range(rng.choice((1, 1, 2, 10, 50)))]
+        body = codec.dumps({"Type": "DeviceControl", "RequestID": str(seq),
+                            "Payload": {"List": codec.dumps_str(rows)}})
+        if len(body) >= compression.COMPRESS_THRESHOLD:
+            packed = compression.compress(body)
+            parts.append(compression.pack_header(len(packed), compression.FLAG_ZLIB,
+                                                 compression.DEFAULT_DICTIONARY, len(body)))
+            parts.append(packed)
+        else:
+            parts.append(struct.pack("<I", len(body)).ljust(32, b"\x00"))
+            parts.append(body)
+    return b"".join(parts)
+
+
+async def run_parse(args) -> Dict[str, Any]:
+    """同一段按64KiB分块到达的下行字节流：FrameParser与stream传输逐帧readexactly的解析吞吐"""
+    frames = args.rounds * 1000
+    data = _inbound_stream(frames)
+    chunk = 65536
+    chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+
+    started = time.perf_counter()
+    parser = FrameParser(codec.loads)
+    parsed = 0
+    for piece in chunks:
+        parsed += len(parser.feed(piece))
+    protocol_time = time.perf_counter() - started
+    assert parsed == frames
+
+    # 与_receive_one相同的读法，数据和读取交替进行
+    reader = asyncio.StreamReader(limit=2 ** 22)
+
+    async def produce():
+        for piece in chunks:
+            reader.feed_data(piece)
+            await asyncio.sleep(0)
+        reader.feed_eof()
+
+    async def consume() -> int:
+        count = 0
+        while count < frames:
+            header = await reader.readexactly(32)
+            size, flags, dict_id, _ = compression.unpack_header(header)
+            body = await reader.readexactly(size)
+            if flags & compression.FLAG_ZLIB:
+                body = compression.decompress(body, dict_id, 1024 * 1024)
+            codec.loads(body)
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    _, consumed = await asyncio.gather(produce(), consume())
+    stream_time = time.perf_counter() - started
+    assert consumed == frames
+
+    return {
+        "scenario": "parse",
+        "frames": frames,
+        "bytes": len(data),
+        "protocol_frames_per_s": round(frames / protocol_time),
+        "stream_frames_per_s": round(frames / stream_time),
+        "protocol_mb_per_s": round(len(data) / protocol_time / 1e6, 1),
+        "stream_mb_per_s": round(len(data) / stream_time / 1e6, 1),
+        "speedup": round(stream_time / protocol_time, 2),
+    }
+
+
+async def run_control_merge(args) -> Dict[str, Any]:
+    """args.rows行DeviceControl：合并后的服务调用与逐行调用，从下发到处理函数全部执行完的耗时"""
+    async with Bench(args) as bench:
+        hass = bench.hass
+        handled = 0
+
+        async def handle(call):
+            nonlocal handled
+            handled += 1
+
+        hass.services.async_register("light", "turn_on", handle)
+        rows = [{"domain": "light", "service": "turn_on",
+                 "data": {"entity_id": e, "brightness": 128 if i % 2 else 255}}
+                for i, e in enumerate(bench.entity_ids[:args.rows])]
+        timings: Dict[str, List[float]] = {"merged": [], "per_row": []}
+        calls: Dict[str, int] = {}
+        for _ in range(args.rounds):
+            handled = 0
+            started = time.perf_counter()
+            await bench.client.on_device_control({"Payload": {"Rows": rows}})
+            await hass.async_block_till_done()
+            timings["merged"].append(time.perf_counter() - started)
+            calls["merged"] = handled
+
+            handled = 0
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                hass.services.async_call(row["domain"], row["service"], dict(row["data"]), blocking=False)
+                for row in rows
+            ])
+            await hass.async_block_till_done()
+            timings["per_row"].append(time.perf_counter() - started)
+            calls["per_row"] = handled
+        return {
+            "scenario": "control_merge",
+            "rows": len(rows),
+            "service_calls": calls,
+            "merged": percentiles(timings["merged"]),
+            "per_row": percentiles(timings["per_row"]),
+        }
+
+
+async def run_subscription(args) -> Dict[str, Any]:
+    """订阅过滤的逐事件开销：args.entities个订阅实体，args.rate*args.duration个事件，约一半是未订阅实体"""
+    subscribed = [f"sensor.bench_{i}" for i in range(args.entities)]
+    rng = random.Random(0)
+    events = [
+        rng.choice(subscribed) if rng.random() < 0.5 else f"sensor.other_{rng.randrange(args.entities)}"
+        for _ in range(int(args.rate * args.duration))
+    ]
+
+    def per_event_ns(container, sample) -> float:
+        started = time.perf_counter()
+        for entity_id in sample:
+            entity_id in container  # noqa: B015
+        return round((time.perf_counter() - started) / len(sample) * 1e9, 1)
+
+    # 原实现的列表查找是O(n)，只取一部分事件
+    list_ns = per_event_ns(subscribed, events[:2000])
+    set_ns = per_event_ns(set(subscribed), events)
+
+    # 完整的on_state_changed路径：未订阅实体在入口返回，订阅实体经过显著性过滤和防抖登记
+    HASSLIFE_CONFIGS.load("release")
+    hass = await create_hass()
+    try:
+        client = SimpleNamespace(entity_ids=set(subscribed))
+        manager = StateSyncManager(hass, client, ["sensor"])
+        states = {eid: State(eid, "0") for eid in set(events)}
+        changed = {eid: State(eid, "1") for eid in states}
+        started = time.perf_counter()
+        for entity_id in events:
+            manager.on_state_changed(entity_id, states[entity_id], changed[entity_id])
+        handler_ns = round((time.perf_counter() - started) / len(events) * 1e9, 1)
+    finally:
+        await hass.async_stop(force=True)
+    return {
+        "scenario": "subscription",
+        "subscribed": len(subscribed),
+        "events": len(events),
+        "list_lookup_ns": list_ns,
+        "set_lookup_ns": set_ns,
+        "on_state_changed_ns": handler_ns,
+        "pending_sync": manager.get_sync_stats()["pending_sync_count"],
+    }
+
+
+def measure_import() -> float:
+    """在新进程中测量导入集成模块的耗时"""
+    code = (
+        "import sys, time; sys.path.insert(0, sys.argv[1]); t = time.perf_counter(); "
+        "import hasslife, hasslife.client_optimized; print(time.perf_counter() - t)"
+    )
+    out = subprocess.run([sys.executable, "-c", code, os.path.join(ROOT, "custom_components")],
+                         check=True, capture_output=True, text=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+async def run_startup(args) -> Dict[str, Any]:
+    """导入耗时和从start()到服务器收到Auth应答的耗时"""
+    imports = [measure_import() for _ in range(args.rounds)]
+    auths = []
+    for _ in range(args.rounds):
+        async with Bench(args) as bench:
+            auths.append(bench.time_to_auth)
+    return {
+        "scenario": "startup",
+        "connect_jitter": args.jitter,
+        "import": percentiles(imports),
+        "time_to_auth": percentiles(auths),
+    }
+
+
+async def run_failover(args) -> Dict[str, Any]:
+    """多台模拟服务器：依次关停当前连接的服务器，测量切换到下一台并完成Auth的耗时"""
+    entity_ids = [f"light.bench_{i}" for i in range(args.entities)]
+    servers = [StubServer(entity_ids) for _ in range(args.servers)]
+    ports = [await server.start() for server in servers]
+    hass = await create_hass()
+    HASSLIFE_CONFIGS.load("release")
+    HASSLIFE_CONFIGS.get_config_object()["hassconfig"] = {
+        "username": "bench", "password": "bench", "connect_jitter": args.jitter,
+    }
+    endpoints = [("127.0.0.1", port) for port in ports]
+    client = OptimizedTcpClient("127.0.0.1", ports[0], hass, args.transport, endpoints)
+    await client.start()
+
+    async def wait_authed() -> StubServer:
+        while True:
+            for server in servers:
+                if server.authed.is_set():
+                    return server
+            await asyncio.sleep(0.005)
+
+    failovers = []
+    try:
+        current = await asyncio.wait_for(wait_authed(), 30)
+        for _ in range(args.servers - 1):
+            for server in servers:
+                server.authed.clear()
+            killed = time.monotonic()
+            await current.close()
+            servers.remove(current)
+            current = await asyncio.wait_for(wait_authed(), 60)
+            failovers.append(time.monotonic() - killed)
+        endpoint_stats = client.get_diagnostics()["endpoints"]
+    finally:
+        await client.stop()
+        for server in servers:
+            await server.close()
+        await hass.async_stop(force=True)
+    return {
+        "scenario": "failover",
+        "servers": args.servers,
+        "connect_jitter": args.jitter,
+        "failover": percentiles(failovers),
+        "endpoints": endpoint_stats,
+    }
+
+
+async def run_codec(args) -> Dict[str, Any]:
+    """climate/media_player状态的内层State编码：原实现（json+JSONEncoder, default=str）与codec对比"""
+    iterations = args.rounds * 1000
+    result: Dict[str, Any] = {"scenario": "codec", "codec": codec.CODEC_NAME, "iterations": iterations}
+
+    def timed(fn, payload) -> float:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn(payload)
+        return round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+    for domain, (state, attributes) in CODEC_SAMPLES.items():
+        payload = {"attributes": attributes, "entity_id": f"{domain}.bench", "state": state}
+        baseline = json.dumps(payload, cls=JSONEncoder, default=str)
+        encoded = codec.dumps_str(payload)
+        result[domain] = {
+            "json_us": timed(lambda p: json.dumps(p, cls=JSONEncoder, default=str), payload),
+            "codec_us": timed(codec.dumps_str, payload),
+            "json_bytes": len(baseline.encode()),
+            "codec_bytes": len(encoded.encode()),
+            # 服务器看到的内容必须与原实现一致
+            "same_output": json.loads(baseline) == json.loads(encoded),
+        }
+    return result
+
+
+async def run(args, scenario: str) -> Dict[str, Any]:
+    if scenario == "startup":
+        return await run_startup(args)
+    if scenario == "storm":
+        return await run_storm(args)
+    if scenario == "slow_consumer":
+        return await run_storm(args, "slow_consumer", read_delay=args.read_delay)
+    if scenario == "lossy":
+        return await run_storm(args, "lossy", drop_rate=args.drop_rate)
+    if scenario == "reconnect_storm":
+        return await run_reconnect_storm(args)
+    if scenario == "control":
+        return await run_control(args)
+    if scenario == "failover":
+        return await run_failover(args)
+    if scenario == "codec":
+        return await run_codec(args)
+    if scenario == "unsubscribed":
+        return await run_unsubscribed(args)
+    if scenario == "parse":
+        return await run_parse(args)
+    if scenario == "control_merge":
+        return await run_control_merge(args)
+    if scenario == "subscription":
+        return await run_subscription(args)
+    raise ValueError(scenario)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="HassLife client load test")
+    parser.add_argument("--scenario", default="storm", choices=SCENARIOS + ("all",))
+    parser.add_argument("--transport", default="stream", choices=("stream", "protocol"))
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--rate", type=int, default=2000, help="state changes per second")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--read-delay", type=float, default=0.005)
+    parser.add_argument("--drop-rate", type=float, default=0.001)
+    parser.add_argument("--kill-interval", type=float, default=2)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--servers", type=int, default=3, help="stub servers for failover")
+    parser.add_argument("--jitter", type=float, default=0.0, help="client connect_jitter bound")
+    parser.add_argument("--memory", action="store_true", help="trace peak python allocations")
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    for scenario in scenarios:
+        if args.memory:
+            tracemalloc.start()
+        result = await run(args, scenario)
+        if args.memory:
+            result["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+            tracemalloc.stop()
+        print(json.dumps(result, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
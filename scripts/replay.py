@@ -0,0 +1,218 @@
+"""
+录制流量回放
+把 record_traffic 录下的文件重新灌入 OptimizedTcpClient：下行帧交给 process_json_pack，
+上行的状态上报还原为 hass 状态变化，再经过状态管理器、合并和编码写入空连接。
+用于在固定输入下比较编码、合并、压缩和分发的性能。需要安装 homeassistant。
+压缩统计分两部分：录制的上行消息体离线压缩的结果，以及回放时客户端实际发出的（取决于录制中协商的特性）。
+
+    python scripts/replay.py hasslife_traffic.rec --speed 10
+    python scripts/replay.py hasslife_traffic.rec --speed 0     # 不等待，尽快回放
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, os.path.join(ROOT, "custom_components"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from hasslife import codec, compression  # noqa: E402
+from hasslife.client_optimized import OptimizedTcpClient  # noqa: E402
+from hasslife.const import FEATURE_ZLIB  # noqa: E402
+from hasslife.hasslife_config import HASSLIFE_CONFIGS  # noqa: E402
+from hasslife.recording import DIRECTION_IN, DIRECTION_OUT, iter_records  # noqa: E402
+from bench import create_hass  # noqa: E402
+
+
+class NullWriter:
+    """吞掉所有写入的连接，只统计帧数和字节数"""
+
+    def __init__(self):
+        self.writes = 0
+        self.bytes = 0
+
+    def writelines(self, buffers):
+        self.writes += 1
+        self.bytes += sum(len(b) for b in buffers)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def recorded_compression(records: List[Tuple[float, int, bytes]]) -> Dict[str, Any]:
+    """录制的上行消息体按客户端的规则（超过阈值且压缩后更小）压缩，统计字节数和CPU耗时"""
+    raw = wire = frames = compressed = 0
+    cpu = 0.0
+    for _, direction, body in records:
+        if direction != DIRECTION_OUT:
+            continue
+        frames += 1
+        raw += 32 + len(body)
+        if len(body) < compression.COMPRESS_THRESHOLD:
+            wire += 32 + len(body)
+            continue
+        started = time.perf_counter()
+        packed = compression.compress(body)
+        cpu += time.perf_counter() - started
+        if len(packed) < len(body):
+            compressed += 1
+            wire += 32 + len(packed)
+        else:
+            wire += 32 + len(body)
+    return {
+        "frames": frames,
+        "compressed_frames": compressed,
+        "raw_bytes": raw,
+        "wire_bytes": wire,
+        "ratio": round(wire / raw, 3) if raw else None,
+        "cpu_s": round(cpu, 4),
+    }
+
+
+def recorded_states(message: Dict[str, Any]) -> List[Dict[str, Any]]:
+    payload = message.get("Payload") or {}
+    if message.get("Type") == "SyncState":
+        return [json.loads(payload["State"])]
+    if message.get("Type") == "SyncStates":
+        return json.loads(payload["States"])
+    return []
+
+
+class Replayer:
+    def __init__(self, records: List[Tuple[float, int, bytes]], speed: float):
+        self.records = records
+        self.speed = speed
+        # 按增量规则还原出的实体属性
+        self.view: Dict[str, Dict[str, Any]] = {}
+        self.counts: Counter = Counter()
+
+    def _apply(self, hass, state: Dict[str, Any]):
+        entity_id = state["entity_id"]
+        attributes = dict(state.get("attributes") or {})
+        if state.get("delta") and entity_id in self.view:
+            merged = dict(self.view[entity_id])
+            merged.update(attributes)
+            for key in state.get("removed", []):
+                merged.pop(key, None)
+            attributes = merged
+        self.view[entity_id] = attributes
+        hass.states.async_set(entity_id, state["state"], attributes)
+
+    def _register_services(self, hass):
+        """为录制中出现的控制命令注册空服务，控制结果由录制的上行状态体现"""
+        async def noop(call):
+            pass
+
+        for _, direction, body in self.records:
+            if direction != DIRECTION_IN:
+                continue
+            message = codec.loads(body)
+            if message.get("Type") != "DeviceControl":
+                continue
+            for row in message.get("Payload", {}).get("Rows", []):
+                if isinstance(row, dict) and not hass.services.has_service(row.get("domain"), row.get("service")):
+                    hass.services.async_register(row["domain"], row["service"], noop)
+
+    async def run(self) -> Dict[str, Any]:
+        hass = await create_hass()
+        self._register_services(hass)
+        HASSLIFE_CONFIGS.load("release")
+        HASSLIFE_CONFIGS.get_config_object()["hassconfig"] = {"username": "replay", "password": "replay"}
+
+        client = OptimizedTcpClient("127.0.0.1", 0, hass)
+        writer = NullWriter()
+        client.writer = writer
+        client.is_connected = True
+        client._state_manager.start()
+        sender = asyncio.create_task(client._send_worker())
+
+        base = self.records[0][0] if self.records else 0.0
+        started = time.monotonic()
+        for ts, direction, body in self.records:
+            if self.speed > 0:
+                delay = (ts - base) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            message = codec.loads(body)
+            msg_type = message.get("Type")
+            self.counts[f"{'in' if direction == DIRECTION_IN else 'out'}:{msg_type}"] += 1
+            if direction == DIRECTION_IN:
+                await client.process_json_pack(message)
+            elif direction == DIRECTION_OUT:
+                for state in recorded_states(message):
+                    self._apply(hass, state)
+            await asyncio.sleep(0)
+        fed = time.monotonic() - started
+
+        # 等待状态管理器和发送队列排空
+        while client._state_manager.get_sync_stats()["pending_sync_count"] or client.queue_depth:
+            await asyncio.sleep(0.05)
+        await client._dispatcher.cancel_all()
+        elapsed = time.monotonic() - started
+
+        sender.cancel()
+        client._state_manager.stop()
+        client._update_state_listeners(set())
+        await hass.async_stop(force=True)
+
+        diag = client.get_diagnostics()
+        histograms = diag["metrics"]["histograms"]
+        counters = client.metrics.counters
+        raw_sent = counters["raw_bytes_sent"]
+        recorded_out = sum(v for k, v in self.counts.items() if k.startswith("out:"))
+        return {
+            "records": len(self.records),
+            "recorded_span_s": round(self.records[-1][0] - base, 2) if self.records else 0,
+            "speed": self.speed,
+            "feed_s": round(fed, 3),
+            "elapsed_s": round(elapsed, 3),
+            "messages": dict(self.counts),
+            "recorded_frames_out": recorded_out,
+            "replayed_frames_out": diag["send"]["frames"],
+            "replayed_writes": writer.writes,
+            "replayed_bytes": writer.bytes,
+            "encode_time": histograms["encode_time"],
+            "recorded_compression": recorded_compression(self.records),
+            "replayed_compression": {
+                "zlib_negotiated": client.supports(FEATURE_ZLIB),
+                "compressed_frames": counters["compressed_frames"],
+                "raw_bytes": raw_sent,
+                "wire_bytes": writer.bytes,
+                "ratio": round(writer.bytes / raw_sent, 3) if raw_sent else None,
+                "compress_in_bytes": counters["compress_in_bytes"],
+                "compress_out_bytes": counters["compress_out_bytes"],
+                "cpu_s": round(client.metrics.histograms["compress_time"].total, 4),
+                "compress_time": histograms["compress_time"],
+            },
+            "control_latency": histograms["control_latency"],
+            "outbound": diag["outbound"],
+            "sync": diag["sync"],
+        }
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Replay a HassLife traffic recording")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed multiplier, 0 = as fast as possible")
+    args = parser.parse_args()
+
+    records = list(iter_records(args.path))
+    result = await Replayer(records, args.speed).run()
+    print(json.dumps(result, indent=2, sort_keys=True, default=str))
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,249 @@
+"""
+本地HassLife模拟服务器
+实现32字节头分帧和 Auth/Ping/UpdateEntitys/SyncDevice/DeviceControl 消息，
+用于在没有 server.blear.cn 的情况下测试 OptimizedTcpClient 并测量性能。
+
+单独运行：
+    python scripts/stub_server.py --port 4448 --entities light.a,light.b
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import struct
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+HEADER_LEN = 32
+MAX_FRAME_SIZE = 1024 * 1024
+ALL_FEATURES = ["BatchState", "AttrDelta", "ControlResult", "Zlib", "QueryStates"]
+
+
+def _load_compression():
+    """直接按文件加载compression.py，避免导入依赖HA的hasslife包"""
+    path = os.path.join(os.path.dirname(__file__), os.pardir,
+                        "custom_components", "hasslife", "compression.py")
+    spec = importlib.util.spec_from_file_location("hasslife_compression", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+compression = _load_compression()
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message).encode()
+    return struct.pack("<I", len(body)).ljust(HEADER_LEN, b"\x00") + body
+
+
+class Session:
+    """单个客户端连接"""
+
+    def __init__(self, server: "StubServer", reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.authed = False
+        self.features: Set[str] = set()
+        # 按增量协议还原出的实体视图 entity_id -> {"state":..., "attributes":...}
+        self.view: Dict[str, Dict[str, Any]] = {}
+
+    async def send(self, message: Dict[str, Any]):
+        self.writer.write(encode_frame(message))
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+    async def read_frame(self) -> Dict[str, Any]:
+        header = await self.reader.readexactly(HEADER_LEN)
+        size, flags, dict_id, _ = compression.unpack_header(header)
+        if size <= 0 or size > MAX_FRAME_SIZE:
+            raise ValueError(f"invalid packet size: {size}")
+        body = await self.reader.readexactly(size)
+        stats = self.server.stats
+        stats["frames_in"] += 1
+        stats["bytes_in"] += HEADER_LEN + size
+        if flags & compression.FLAG_ZLIB:
+            stats["compressed_frames_in"] += 1
+            body = compression.decompress(body, dict_id, MAX_FRAME_SIZE)
+            stats["raw_bytes_in"] += HEADER_LEN + len(body)
+        else:
+            stats["raw_bytes_in"] += HEADER_LEN + size
+        return json.loads(body)
+
+    def apply_state(self, payload: Dict[str, Any]):
+        """按全量/增量规则更新实体视图"""
+        entity_id = payload["entity_id"]
+        if payload.get("delta") and entity_id in self.view:
+            entry = self.view[entity_id]
+            entry["attributes"].update(payload.get("attributes") or {})
+            for key in payload.get("removed", []):
+                entry["attributes"].pop(key, None)
+            entry["state"] = payload["state"]
+        else:
+            self.view[entity_id] = {
+                "state": payload["state"],
+                "attributes": dict(payload.get("attributes") or {}),
+            }
+        self.server.latest[entity_id] = self.view[entity_id]
+
+
+class StubServer:
+    """模拟服务器
+
+    可选的故障注入：
+        read_delay   每读一帧后等待的秒数，模拟慢消费者
+        drop_rate    每收到一帧后断开连接的概率，模拟丢包导致的断线
+    """
+
+    def __init__(self, entity_ids: Iterable[str] = (), features: Iterable[str] = ALL_FEATURES,
+                 read_delay: float = 0.0, drop_rate: float = 0.0):
+        self.entity_ids = list(entity_ids)
+        self.features = list(features)
+        self.read_delay = read_delay
+        self.drop_rate = drop_rate
+        self.sessions: Set[Session] = set()
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, int] = defaultdict(int)
+        self.control_results: Dict[str, Any] = {}
+        self.query_results: Dict[str, Any] = {}
+        self.pages: List[Dict[str, Any]] = []
+        self.auth_times: List[float] = []
+        self.authed = asyncio.Event()
+        # 每收到一个实体状态时回调 (entity_id, payload, 到达时间)
+        self.on_state: Optional[Callable[[str, Dict[str, Any], float], None]] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.kill_all()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def kill_all(self):
+        """断开所有连接，模拟服务器重启或网络闪断"""
+        for session in list(self.sessions):
+            session.close()
+
+    async def broadcast(self, message: Dict[str, Any]):
+        for session in list(self.sessions):
+            if session.authed:
+                try:
+                    await session.send(message)
+                except ConnectionError:
+                    pass
+
+    async def update_entitys(self, entity_ids: Iterable[str]):
+        self.entity_ids = list(entity_ids)
+        await self.broadcast({"Type": "UpdateEntitys", "Payload": {"entity_ids": self.entity_ids}})
+
+    async def send_control(self, rows: List[Dict[str, Any]], request_id: str = ""):
+        await self.broadcast({"Type": "DeviceControl", "RequestID": request_id,
+                              "Payload": {"Rows": rows}})
+
+    async def request_page(self, page: int = 1, page_size: int = 30, keyword: Optional[str] = None,
+                           request_id: str = ""):
+        await self.broadcast({"Type": "SyncDevice", "RequestID": request_id,
+                              "Payload": {"page": page, "page_size": page_size,
+                                          "search_keyword": keyword}})
+
+    async def query_states(self, entity_ids: List[str], request_id: str = ""):
+        await self.broadcast({"Type": "QueryStates", "RequestID": request_id,
+                              "Payload": {"entity_ids": entity_ids}})
+
+    async def _handle(self, reader, writer):
+        session = Session(self, reader, writer)
+        self.sessions.add(session)
+        self.stats["connections"] += 1
+        try:
+            await session.send({"Type": "Auth", "Payload": {"Features": self.features}})
+            while True:
+                message = await session.read_frame()
+                if self.read_delay:
+                    await asyncio.sleep(self.read_delay)
+                await self._dispatch(session, message)
+                if self.drop_rate and random.random() < self.drop_rate:
+                    self.stats["injected_drops"] += 1
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            session.close()
+
+    async def _dispatch(self, session: Session, message: Dict[str, Any]):
+        msg_type = message.get("Type")
+        self.stats[f"type:{msg_type}"] += 1
+        payload = message.get("Payload") or {}
+        now = time.monotonic()
+        if msg_type == "Auth":
+            session.authed = True
+            session.features = set(payload.get("Features") or [])
+            self.auth_times.append(now)
+            self.authed.set()
+            await session.send({"Type": "UpdateEntitys", "Payload": {"entity_ids": self.entity_ids}})
+        elif msg_type == "Ping":
+            await session.send({"Type": "Pong"})
+        elif msg_type == "SyncState":
+            self._record_states(session, [json.loads(payload["State"])], now)
+        elif msg_type == "SyncStates":
+            self._record_states(session, json.loads(payload["States"]), now)
+        elif msg_type == "SyncDevice":
+            self.pages.append({**payload, "List": json.loads(payload["List"])})
+        elif msg_type == "DeviceControlResult":
+            self.control_results[message.get("RequestID")] = json.loads(payload["Results"])
+        elif msg_type == "QueryStatesResult":
+            self.query_results[message.get("RequestID")] = {
+                **payload, "States": json.loads(payload["States"]),
+            }
+
+    def _record_states(self, session: Session, states: List[Dict[str, Any]], now: float):
+        for state in states:
+            self.stats["states_in"] += 1
+            if state.get("delta"):
+                self.stats["delta_states_in"] += 1
+            session.apply_state(state)
+            if self.on_state:
+                self.on_state(state["entity_id"], state, now)
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="HassLife stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4448)
+    parser.add_argument("--entities", default="", help="comma separated entity_ids to subscribe")
+    parser.add_argument("--features", default=",".join(ALL_FEATURES))
+    parser.add_argument("--read-delay", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(
+        [e for e in args.entities.split(",") if e],
+        [f for f in args.features.split(",") if f],
+        args.read_delay, args.drop_rate,
+    )
+    port = await server.start(args.host, args.port)
+    print(f"stub server listening on {args.host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(json.dumps(dict(server.stats), sort_keys=True))
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
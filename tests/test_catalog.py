@@ -0,0 +1,61 @@
+"""DeviceCatalog：只跟踪白名单域，名称变化实时反映到分页和指纹"""
+
+import json
+from types import SimpleNamespace
+
+from hasslife import catalog
+from hasslife.catalog import DeviceCatalog
+
+
+def _state(entity_id, name):
+    return SimpleNamespace(entity_id=entity_id, state="on", attributes={"friendly_name": name})
+
+
+def _event(entity_id, new_state):
+    return SimpleNamespace(data={"entity_id": entity_id, "new_state": new_state})
+
+
+def _catalog(*states):
+    by_id = {s.entity_id: s for s in states}
+    hass = SimpleNamespace(states=SimpleNamespace(async_all=lambda: list(by_id.values()),
+                                                  get=by_id.get))
+    result = DeviceCatalog(hass, ["light"])
+    result.rebuild()
+    return result
+
+
+def _names(result):
+    return [(d["entity_id"], d["attributes"]["friendly_name"]) for d in json.loads(result.page()[0])]
+
+
+def test_add_rename_remove():
+    result = _catalog(_state("light.a", "A"), _state("switch.x", "X"))
+    assert _names(result) == [("light.a", "A")]
+    fingerprint = result.fingerprint()
+
+    result._async_on_state_changed(_event("light.b", _state("light.b", "B")))
+    assert _names(result) == [("light.a", "A"), ("light.b", "B")]
+
+    # 集成/模板/customize修改friendly_name，没有注册表事件
+    result._async_on_state_changed(_event("light.a", _state("light.a", "Kitchen")))
+    assert _names(result) == [("light.a", "Kitchen"), ("light.b", "B")]
+
+    result._async_on_state_changed(_event("light.b", None))
+    assert _names(result) == [("light.a", "Kitchen")]
+    assert result.fingerprint() != fingerprint
+
+
+def test_plain_state_change_keeps_caches():
+    result = _catalog(_state("light.a", "A"))
+    page = result.page()
+    fingerprint = result.fingerprint()
+    result._async_on_state_changed(_event("light.a", _state("light.a", "A")))
+    assert result.page() is page
+    assert result.fingerprint() == fingerprint
+
+
+def test_search_cache_is_bounded():
+    result = _catalog(_state("light.a", "A"))
+    for i in range(catalog.SEARCH_CACHE_SIZE * 3):
+        result.page(search_keyword=f"kw{i}")
+    assert len(result._search_cache) <= catalog.SEARCH_CACHE_SIZE
@@ -0,0 +1,81 @@
+"""ConnectionManager：本地多服务器故障切换，以及配置中服务器列表的解析"""
+
+import asyncio
+import time
+
+import pytest
+
+from hasslife.connection import ConnectionManager, parse_endpoints
+
+FAILOVER_BOUND = 1.0  # 秒，拒绝连接应立即尝试下一个，远小于CONNECT_TIMEOUT
+
+
+async def _open(ip, port, family):
+    return await asyncio.open_connection(ip, port, family=family)
+
+
+async def _start_servers(count):
+    async def handle(reader, writer):
+        await reader.read()
+        writer.close()
+
+    servers = [await asyncio.start_server(handle, "127.0.0.1", 0) for _ in range(count)]
+    return servers, [s.sockets[0].getsockname()[1] for s in servers]
+
+
+async def _failover(count):
+    servers, ports = await _start_servers(count)
+    manager = ConnectionManager([("127.0.0.1", port) for port in ports])
+    try:
+        (_, writer), first = await manager.connect(_open)
+        assert first.port == ports[0]
+
+        # 关停当前服务器
+        writer.close()
+        servers[0].close()
+        await servers[0].wait_closed()
+
+        started = time.monotonic()
+        (_, writer), second = await manager.connect(_open)
+        elapsed = time.monotonic() - started
+        writer.close()
+        assert second is not first
+        assert second.port in ports[1:]
+        assert elapsed < FAILOVER_BOUND
+
+        # 失败的服务器进入冷却，下一次直接连接健康的服务器
+        assert manager.ordered()[-1] is first
+        (_, writer), third = await manager.connect(_open)
+        writer.close()
+        assert third is not first
+    finally:
+        for server in servers:
+            server.close()
+
+
+@pytest.mark.parametrize("count", [2, 3])
+def test_failover_to_next_endpoint(count):
+    asyncio.run(asyncio.wait_for(_failover(count), 10))
+
+
+def test_all_endpoints_down_raises():
+    async def run():
+        servers, ports = await _start_servers(2)
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+        manager = ConnectionManager([("127.0.0.1", port) for port in ports])
+        with pytest.raises(OSError):
+            await manager.connect(_open)
+        assert all(e.failures == 1 for e in manager.endpoints)
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_parse_endpoints():
+    assert parse_endpoints(
+        ["a.example:4448", "b.example", ["c.example", "4449"], "[::1]:4450", "::1", "2001:db8:0:1"], 4443
+    ) == [
+        ("a.example", 4448), ("b.example", 4443), ("c.example", 4449),
+        ("::1", 4450), ("::1", 4443), ("2001:db8:0:1", 4443),
+    ]
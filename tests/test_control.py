@@ -0,0 +1,52 @@
+"""DeviceControl 行合并与按实体排序的键"""
+
+from hasslife.client_optimized import OptimizedTcpClient
+
+
+def _row(entity_id, **data):
+    return {"domain": "light", "service": "turn_on", "data": {"entity_id": entity_id, **data}}
+
+
+def test_rows_with_same_data_are_merged():
+    calls, errors = OptimizedTcpClient._merge_control_rows([
+        _row("light.a"), _row("light.b"), _row("light.c", brightness=10),
+    ])
+    assert errors == {}
+    assert calls == [
+        ("light", "turn_on", {"entity_id": ["light.a", "light.b"]}, [0, 1]),
+        ("light", "turn_on", {"brightness": 10, "entity_id": "light.c"}, [2]),
+    ]
+
+
+def test_invalid_entity_id_fails_only_its_row():
+    calls, errors = OptimizedTcpClient._merge_control_rows([
+        _row("light.a"), _row("light.bad id"), _row(["light.b", 5]), _row("light.c"),
+    ])
+    assert set(errors) == {1, 2}
+    assert calls == [("light", "turn_on", {"entity_id": ["light.a", "light.c"]}, [0, 3])]
+
+
+def test_entity_ids_are_normalized_like_ha():
+    # cv.entity_ids会先转小写、拆分逗号分隔的字符串
+    calls, errors = OptimizedTcpClient._merge_control_rows([
+        _row("Light.Kitchen"), _row("light.b, LIGHT.C"),
+    ])
+    assert errors == {}
+    assert calls == [
+        ("light", "turn_on", {"entity_id": ["light.kitchen", "light.b", "light.c"]}, [0, 1]),
+    ]
+
+
+def test_all_and_missing_entity_id_are_not_merged():
+    calls, errors = OptimizedTcpClient._merge_control_rows([
+        _row("all"), _row("all"), {"domain": "light", "service": "turn_on"},
+    ])
+    assert errors == {}
+    assert [c[3] for c in calls] == [[0], [1], [2]]
+
+
+def test_control_keys_split_like_merge():
+    keys = OptimizedTcpClient._control_keys({"Type": "DeviceControl", "Payload": {"Rows": [
+        _row("light.b, Light.C"), _row(["light.d"]), {"domain": "light"},
+    ]}})
+    assert keys == {"light.b", "light.c", "light.d"}
@@ -0,0 +1,79 @@
+"""FrameParser 模糊测试：随机切分字节流（含zlib压缩帧），解析结果必须与原始消息一致"""
+
+import json
+import random
+import struct
+
+import pytest
+
+from hasslife import codec, compression
+from hasslife.protocol import FrameParser
+
+
+def _message(rng: random.Random, seq: int) -> dict:
+    states = [
+        {"entity_id": f"light.fuzz_{seq}_{i}", "state": rng.choice(["on", "off", "unavailable"]),
+         "attributes": {"brightness": rng.randrange(256), "friendly_name": f"灯 {i}"}}
+        for i in range(rng.choice([0, 1, 3, 40]))
+    ]
+    return {"Type": "QueryStates", "RequestID": str(seq), "Payload": {"States": json.dumps(states)}}
+
+
+def _frame(message: dict, compress: bool) -> bytes:
+    body = json.dumps(message).encode()
+    if compress:
+        packed = compression.compress(body)
+        header = compression.pack_header(
+            len(packed), compression.FLAG_ZLIB, compression.DEFAULT_DICTIONARY, len(body)
+        )
+        return header + packed
+    return struct.pack("<I", len(body)).ljust(32, b"\x00") + body
+
+
+def _chunks(rng: random.Random, data: bytes):
+    pos = 0
+    while pos < len(data):
+        size = rng.choice([1, 2, 31, 32, 33, rng.randrange(1, 200), rng.randrange(1, 70000)])
+        yield data[pos:pos + size]
+        pos += size
+
+
+@pytest.mark.parametrize("loads", [None, codec.loads], ids=["json", "codec"])
+@pytest.mark.parametrize("seed", range(50))
+def test_random_chunking_roundtrip(seed, loads):
+    rng = random.Random(seed)
+    messages = [_message(rng, seq) for seq in range(rng.randrange(1, 60))]
+    data = b"".join(
+        _frame(m, len(json.dumps(m)) >= compression.COMPRESS_THRESHOLD and rng.random() < 0.7)
+        for m in messages
+    )
+    parser = FrameParser(loads) if loads else FrameParser()
+    parsed = []
+    for chunk in _chunks(rng, data):
+        parsed.extend(parser.feed(chunk))
+    assert parsed == messages
+    assert parser.buffered == 0
+
+
+def test_partial_frame_stays_buffered():
+    frame = _frame({"Type": "Pong"}, False)
+    parser = FrameParser()
+    assert parser.feed(frame[:-1]) == []
+    assert parser.buffered == len(frame) - 1
+    assert parser.feed(frame[-1:]) == [{"Type": "Pong"}]
+
+
+@pytest.mark.parametrize("size", [0, 1024 * 1024 + 1])
+def test_invalid_size_rejected(size):
+    with pytest.raises(ValueError):
+        FrameParser().feed(struct.pack("<I", size).ljust(32, b"\x00"))
+
+
+def test_zlib_bomb_rejected():
+    body = b'{"a":"' + b"x" * 4096 + b'"}'
+    packed = compression.compress(body)
+    header = compression.pack_header(
+        len(packed), compression.FLAG_ZLIB, compression.DEFAULT_DICTIONARY, len(body)
+    )
+    with pytest.raises(ValueError):
+        FrameParser(max_size=1024).feed(header + packed)
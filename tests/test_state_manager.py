@@ -0,0 +1,127 @@
+"""StateSyncManager 尾沿合并防抖（schedule/pop_due/next_timeout），使用假时钟"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from hasslife.state_manager import StateSyncManager
+
+ENTITY_ID = "light.living_room"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeStates:
+    def __init__(self):
+        self._states = {}
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def set(self, entity_id, state, attributes=None):
+        old = self._states.get(entity_id)
+        new = SimpleNamespace(entity_id=entity_id, state=state, attributes=attributes or {})
+        self._states[entity_id] = new
+        return old, new
+
+
+class FakeClient:
+    def __init__(self):
+        self.entity_ids = {ENTITY_ID}
+        self.reported = []
+
+    async def sync_device_states_async(self, states):
+        self.reported.append(list(states))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def client():
+    return FakeClient()
+
+
+@pytest.fixture
+def hass():
+    return SimpleNamespace(states=FakeStates())
+
+
+@pytest.fixture
+def manager(hass, client, clock):
+    return StateSyncManager(hass, client, ["light"], clock=clock)
+
+
+def test_single_change_waits_for_debounce(manager, clock):
+    manager.schedule(ENTITY_ID, clock.now)
+    assert manager.next_timeout(clock.now) == pytest.approx(0.1)
+    clock.now += 0.04
+    assert manager.pop_due(clock.now) == []
+    assert manager.next_timeout(clock.now) == pytest.approx(0.06)
+    clock.now += 0.06
+    assert manager.pop_due(clock.now) == [ENTITY_ID]
+    assert manager.next_timeout(clock.now) is None
+
+
+def test_burst_coalesces_into_one_report(manager, clock):
+    start = clock.now
+    for _ in range(4):
+        manager.schedule(ENTITY_ID, clock.now)
+        clock.now += 0.03
+        assert manager.pop_due(clock.now) == []
+    # 最后一次变化在start+0.09，静默0.1后到期（含0.05的合批提前量）
+    clock.now = start + 0.09 + 0.1 - 0.05
+    assert manager.pop_due(clock.now) == [ENTITY_ID]
+    assert manager.pop_due(clock.now + 1) == []
+
+
+def test_continuous_changes_capped_by_max_delay(manager, clock):
+    start = clock.now
+    reports = []
+    while clock.now < start + 1.2:
+        manager.schedule(ENTITY_ID, clock.now)
+        clock.now += 0.02
+        if manager.pop_due(clock.now):
+            reports.append(clock.now - start)
+    # 一直在变化也不会无限推迟：每轮最迟_max_sync_delay后上报
+    assert reports
+    assert reports[0] <= 0.5 + 1e-9
+    assert len(reports) == 2
+    assert manager.next_timeout(clock.now) <= 0.5
+
+
+def test_slack_batches_nearly_due_entities(manager, clock):
+    manager.schedule(ENTITY_ID, clock.now)
+    clock.now += 0.03
+    manager.schedule("light.kitchen", clock.now)
+    clock.now += 0.07
+    assert sorted(manager.pop_due(clock.now)) == ["light.kitchen", ENTITY_ID]
+
+
+def test_last_state_is_delivered(manager, hass, client, clock):
+    for value in ("on", "off", "on", "off"):
+        old, new = hass.states.set(ENTITY_ID, value, {"brightness": len(client.reported)})
+        manager.on_state_changed(ENTITY_ID, old, new)
+        clock.now += 0.02
+    clock.now += 0.1
+    due = manager.pop_due(clock.now)
+    assert due == [ENTITY_ID]
+    asyncio.run(manager._batch_sync_states(due))
+    assert len(client.reported) == 1
+    assert client.reported[0] == [hass.states.get(ENTITY_ID)]
+    assert client.reported[0][0].state == "off"
+
+
+def test_unsubscribed_entity_is_not_scheduled(manager, hass, clock):
+    old, new = hass.states.set("light.other", "on")
+    manager.on_state_changed("light.other", old, new)
+    assert manager.next_timeout(clock.now) is None
@@ -0,0 +1,45 @@
+"""ControlTracer：只有携带追踪实体状态的帧写出后才结束追踪"""
+
+from hasslife.tracing import ControlTracer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_trace_finishes_on_its_own_flush():
+    clock = FakeClock()
+    tracer = ControlTracer(enabled=True, clock=clock)
+    trace = tracer.start("r1", ["light.a"])
+    clock.now = 0.05
+    tracer.on_state_changed("light.a")
+    clock.now = 0.1
+    tracer.on_flushed(["light.a"])
+    assert tracer.completed == 1
+    assert trace.times["flushed"] == 0.1
+    assert not tracer.slow_traces
+
+
+def test_unrelated_flush_does_not_finish_trace():
+    clock = FakeClock()
+    tracer = ControlTracer(enabled=True, clock=clock)
+    tracer.start("r1", ["light.a"])
+    tracer.on_state_changed("light.a")
+    # 携带light.a的帧丢失，之后只写出了其他实体
+    clock.now = 100
+    tracer.on_flushed(["light.b"])
+    tracer.on_flushed([])
+    assert tracer.completed == 0
+    assert tracer.as_dict()["in_progress"] == 1
+    assert not tracer.slow_traces
+
+
+def test_flush_before_state_change_is_ignored():
+    tracer = ControlTracer(enabled=True, clock=FakeClock())
+    tracer.start("r1", ["light.a"])
+    tracer.on_flushed(["light.a"])
+    assert tracer.completed == 0